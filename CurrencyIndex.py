@@ -0,0 +1,211 @@
+from astrbot.api import logger
+
+import bisect
+import json
+import os
+import time
+from typing import Any, Awaitable, Callable
+
+# 常用货币的中文名称与别名，第一个为展示用的中文名
+CURRENCY_ALIASES: dict[str, list[str]] = {
+    "CNY": ["人民币", "元", "rmb", "yuan", "renminbi"],
+    "USD": ["美元", "美金", "刀", "dollar", "us dollar"],
+    "EUR": ["欧元", "euro"],
+    "JPY": ["日元", "日圆", "円", "yen"],
+    "GBP": ["英镑", "pound", "sterling"],
+    "HKD": ["港币", "港元", "hk dollar"],
+    "MOP": ["澳门元", "澳门币", "pataca"],
+    "TWD": ["新台币", "台币"],
+    "KRW": ["韩元", "韩币", "won"],
+    "RUB": ["卢布", "俄罗斯卢布", "ruble", "rouble"],
+    "AUD": ["澳元", "澳币", "澳大利亚元"],
+    "CAD": ["加元", "加币", "加拿大元"],
+    "NZD": ["新西兰元", "纽币"],
+    "SGD": ["新加坡元", "新币"],
+    "CHF": ["瑞士法郎", "法郎", "franc"],
+    "THB": ["泰铢", "baht"],
+    "INR": ["印度卢比", "卢比", "rupee"],
+    "MYR": ["林吉特", "马币", "ringgit"],
+    "VND": ["越南盾", "dong"],
+    "PHP": ["菲律宾比索", "peso"],
+    "IDR": ["印尼盾", "rupiah"],
+    "SEK": ["瑞典克朗"],
+    "NOK": ["挪威克朗"],
+    "DKK": ["丹麦克朗"],
+    "PLN": ["波兰兹罗提", "zloty"],
+    "TRY": ["土耳其里拉", "lira"],
+    "BRL": ["巴西雷亚尔", "real"],
+    "MXN": ["墨西哥比索"],
+    "ZAR": ["南非兰特", "rand"],
+    "AED": ["阿联酋迪拉姆", "迪拉姆", "dirham"],
+    "SAR": ["沙特里亚尔", "riyal"],
+    "ILS": ["以色列新谢克尔", "谢克尔", "shekel"],
+    "KZT": ["哈萨克斯坦坚戈", "坚戈", "tenge"],
+    "UAH": ["乌克兰格里夫纳", "hryvnia"],
+    "EGP": ["埃及镑"],
+    "BTC": ["比特币", "bitcoin"],
+    "XAU": ["黄金", "gold"],
+    "XAG": ["白银", "silver"],
+}
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.strip().lower().split())
+
+
+def _trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class CurrencyIndex:
+    """货币代码与名称索引
+
+    货币表只加载一次并持久化到本地，之后查询名称与解析用户输入都在内存完成:
+    代码与别名精确匹配为O(1)，前缀匹配使用有序数组二分查找，
+    模糊匹配使用trigram倒排索引。
+    """
+
+    REFRESH_INTERVAL = 7 * 86400  # 货币表刷新间隔(秒)
+    RETRY_INTERVAL = 300  # 获取失败后的重试间隔(秒)
+    FUZZY_THRESHOLD = 0.4  # trigram相似度阈值
+
+    def __init__(self, data_dir: str | None = None):
+        self.path: str | None = (
+            os.path.join(data_dir, "currencies.json") if data_dir else None
+        )
+        self.names: dict[str, str] = {}  # 货币代码 -> 英文名称
+        self.updated_at: float = 0.0
+        self._terms: dict[str, str] = {}  # 规范化的名称/别名 -> 货币代码
+        self._sorted_terms: list[str] = []  # 用于前缀查找
+        self._trigram_index: dict[str, set[str]] = {}  # trigram -> 名称/别名
+        self._formatted_list: str | None = None
+        self._retry_at: float = 0.0
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self.names)
+
+    def needs_refresh(self) -> bool:
+        return time.time() - self.updated_at >= self.REFRESH_INTERVAL
+
+    async def ensure(self, fetch: Callable[[], Awaitable[dict[str, str]]]):
+        """首次使用时加载本地货币表，缺失或过期时才调用fetch从接口获取
+
+        获取失败时保留已有数据，并在RETRY_INTERVAL秒内不再重试。
+        """
+        if not self.loaded:
+            self.load_cached()
+        if (self.loaded and not self.needs_refresh()) or time.time() < self._retry_at:
+            return
+        try:
+            self.update(await fetch())
+        except Exception as e:
+            self._retry_at = time.time() + self.RETRY_INTERVAL
+            logger.warning(f"获取货币列表失败: {e}")
+
+    def load_cached(self) -> bool:
+        """从本地文件加载货币表，成功返回True"""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data: dict[str, Any] = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取货币列表缓存失败: {e}")
+            return False
+        self._build(data.get("currencies", {}), data.get("updated_at", 0.0))
+        return self.loaded
+
+    def update(self, currencies: dict[str, str]):
+        """使用接口返回的货币表重建索引并持久化"""
+        self._build(currencies, time.time())
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"updated_at": self.updated_at, "currencies": self.names},
+                    f,
+                    ensure_ascii=False,
+                )
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"保存货币列表失败: {e}")
+
+    def _build(self, currencies: dict[str, str], updated_at: float):
+        self.names = dict(currencies)
+        self.updated_at = updated_at
+        self._formatted_list = None
+
+        terms: dict[str, str] = {}
+        for code, name in self.names.items():
+            terms.setdefault(_normalize(name), code)
+        # 别名优先于英文全称，如 "dollar" 固定指向美元
+        for code, aliases in CURRENCY_ALIASES.items():
+            for alias in aliases:
+                terms[_normalize(alias)] = code
+        self._terms = terms
+        self._sorted_terms = sorted(terms)
+
+        trigram_index: dict[str, set[str]] = {}
+        for term in terms:
+            for gram in _trigrams(term):
+                trigram_index.setdefault(gram, set()).add(term)
+        self._trigram_index = trigram_index
+
+    def name(self, code: str) -> str:
+        """货币名称，未知时返回代码本身"""
+        return self.names.get(code, code)
+
+    def resolve(self, text: str) -> str | None:
+        """把用户输入的代码、中英文名称或别名解析为货币代码，无法识别时返回None"""
+        code = text.strip().upper()
+        if code in self.names or (not self.names and len(code) == 3 and code.isalpha()):
+            return code
+
+        term = _normalize(text)
+        if not term:
+            return None
+        if term in self._terms:
+            return self._terms[term]
+
+        # 前缀唯一匹配，如 "swiss" -> CHF
+        start = bisect.bisect_left(self._sorted_terms, term)
+        matches = set()
+        for candidate in self._sorted_terms[start:]:
+            if not candidate.startswith(term):
+                break
+            matches.add(self._terms[candidate])
+        if len(matches) == 1:
+            return matches.pop()
+
+        return self._fuzzy(term)
+
+    def _fuzzy(self, term: str) -> str | None:
+        """trigram相似度最高且超过阈值的货币"""
+        grams = _trigrams(term)
+        shared: dict[str, int] = {}
+        for gram in grams:
+            for candidate in self._trigram_index.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+
+        best_code, best_score = None, self.FUZZY_THRESHOLD
+        for candidate, count in shared.items():
+            score = count / len(grams | _trigrams(candidate))
+            if score > best_score:
+                best_code, best_score = self._terms[candidate], score
+        return best_code
+
+    def formatted_list(self) -> str:
+        """支持的货币代码列表文本，构建一次后复用"""
+        if self._formatted_list is None:
+            lines = ["🏦【支持的货币代码】\n"]
+            for code, name in sorted(self.names.items()):
+                aliases = CURRENCY_ALIASES.get(code)
+                suffix = f" ({aliases[0]})" if aliases else ""
+                lines.append(f"• {code}: {name}{suffix}\n")
+            self._formatted_list = "\n".join(lines)
+        return self._formatted_list
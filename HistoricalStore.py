@@ -0,0 +1,159 @@
+from astrbot.api import logger
+
+import json
+import math
+import mmap
+import os
+import struct
+from typing import Any
+
+
+class HistoricalStore:
+    """过去日期汇率的本地存储
+
+    过去日期的汇率不会再变化，因此只追加不修改。
+    数据文件由定长 float64 行组成，每个日期一行：第0列为快照时间戳，
+    其余列按货币代码索引存放美元基准汇率，缺失值记为 NaN。
+    读取时通过 mmap 映射文件，多年归档也几乎不占用常驻内存。
+    """
+
+    ROW_WIDTH = 256  # 每行列数(含时间戳列)，即最多支持255种货币
+
+    def __init__(self, data_dir: str):
+        self.data_dir: str = data_dir
+        self.data_path: str = os.path.join(data_dir, "historical.bin")
+        self.index_path: str = os.path.join(data_dir, "historical.json")
+        self.codes: list[str] = []  # 列号-1 -> 货币代码
+        self.columns: dict[str, int] = {}  # 货币代码 -> 列号
+        self.rows: dict[str, int] = {}  # 日期 -> 行号
+        self._row_format = struct.Struct(f"<{self.ROW_WIDTH}d")
+        self._file = None
+        self._mmap: mmap.mmap | None = None
+        self._loaded: bool = False
+
+    def _load_index(self):
+        """延迟加载日期与货币索引"""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            self.codes = index.get("codes", [])
+            self.columns = {code: i + 1 for i, code in enumerate(self.codes)}
+            self.rows = index.get("dates", {})
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取历史汇率索引失败: {e}")
+            self.codes, self.columns, self.rows = [], {}, {}
+
+    def _mapped_rows(self) -> int:
+        if self._mmap is None:
+            return 0
+        return len(self._mmap) // self._row_format.size
+
+    def _ensure_mapped(self, row: int) -> bool:
+        """确保指定行已被映射，文件追加后重新映射"""
+        if row < self._mapped_rows():
+            return True
+        self._unmap()
+        if not os.path.exists(self.data_path):
+            return False
+        if os.path.getsize(self.data_path) < self._row_format.size:
+            return False
+        self._file = open(self.data_path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return row < self._mapped_rows()
+
+    def _unmap(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __contains__(self, date_str: str) -> bool:
+        self._load_index()
+        return date_str in self.rows
+
+    def get(self, date_str: str) -> dict[str, Any] | None:
+        """读取某日的美元基准汇率快照，不存在时返回None"""
+        self._load_index()
+        row = self.rows.get(date_str)
+        if row is None or not self._ensure_mapped(row):
+            return None
+
+        values = self._row_format.unpack_from(self._mmap, row * self._row_format.size)
+        rates = {
+            code: value
+            for code, value in zip(self.codes, values[1:])
+            if not math.isnan(value)
+        }
+        return {"timestamp": int(values[0]), "base": "USD", "rates": rates}
+
+    def get_rates(self, date_str: str, codes: list[str]) -> dict[str, float] | None:
+        """只读取某日指定货币的美元基准汇率，不解包整行，不存在时返回None"""
+        self._load_index()
+        row = self.rows.get(date_str)
+        if row is None or not self._ensure_mapped(row):
+            return None
+
+        offset = row * self._row_format.size
+        rates = {}
+        for code in codes:
+            column = self.columns.get(code)
+            if column is None:
+                continue
+            (value,) = struct.unpack_from("<d", self._mmap, offset + column * 8)
+            if not math.isnan(value):
+                rates[code] = value
+        return rates
+
+    def put(self, date_str: str, data: dict[str, Any]) -> None:
+        """追加某日的美元基准汇率快照，已存在的日期直接忽略"""
+        self._load_index()
+        if date_str in self.rows:
+            return
+
+        rates: dict[str, float] = data.get("rates", {})
+        for code in rates:
+            if code not in self.columns:
+                if len(self.codes) >= self.ROW_WIDTH - 1:
+                    logger.warning(f"历史汇率存储列已满，忽略货币 {code}")
+                    continue
+                self.codes.append(code)
+                self.columns[code] = len(self.codes)
+
+        values = [math.nan] * self.ROW_WIDTH
+        values[0] = float(data.get("timestamp") or 0)
+        for code, value in rates.items():
+            column = self.columns.get(code)
+            if column is not None:
+                values[column] = float(value)
+
+        try:
+            os.makedirs(self.data_dir, exist_ok=True)
+            # 先追加数据再写索引，保证索引不会指向不存在的行
+            with open(self.data_path, "ab") as f:
+                size = f.tell()
+                if size % self._row_format.size:  # 丢弃上次中断写入的残缺行
+                    size -= size % self._row_format.size
+                    f.truncate(size)
+                row = size // self._row_format.size
+                f.write(self._row_format.pack(*values))
+            self.rows[date_str] = row
+            self._write_index()
+        except OSError as e:
+            logger.error(f"写入历史汇率失败: {e}")
+
+    def _write_index(self):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"codes": self.codes, "dates": self.rows}, f)
+        os.replace(tmp_path, self.index_path)
+
+    def close(self):
+        """释放文件映射"""
+        self._unmap()
@@ -0,0 +1,142 @@
+import math
+import re
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# 当前命令的上游请求计数，由 count_requests 设置；命令中创建的任务会继承它，
+# 与命令无关的后台任务(如预取)中为None
+_request_tally: ContextVar[list[int] | None] = ContextVar("request_tally", default=None)
+
+
+@contextmanager
+def count_requests():
+    """统计代码块内(含其中创建的任务)发起的上游请求数，产出单元素计数列表"""
+    previous = _request_tally.get()
+    tally = [0]
+    _request_tally.set(tally)
+    try:
+        yield tally
+    finally:
+        # 不使用reset: 异步生成器可能在其他上下文中被关闭
+        _request_tally.set(previous)
+
+
+def record_request():
+    """把一次上游请求计入当前命令"""
+    tally = _request_tally.get()
+    if tally is not None:
+        tally[0] += 1
+
+
+class Histogram:
+    """耗时直方图，保留最近若干次采样用于计算分位数"""
+
+    def __init__(self, max_samples: int = 1024):
+        self.samples: deque[float] = deque(maxlen=max_samples)  # 毫秒
+        self.count: int = 0
+        self.total: float = 0.0
+
+    def observe(self, value_ms: float):
+        self.samples.append(value_ms)
+        self.count += 1
+        self.total += value_ms
+
+    def percentile(self, p: float) -> float:
+        """最近采样的第p百分位数(最近秩法)，无采样时为0"""
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = max(math.ceil(p / 100 * len(ordered)) - 1, 0)
+        return ordered[index]
+
+
+class Metrics:
+    """进程内指标: 耗时分位数与计数器，可输出为文本或Prometheus格式
+
+    指标以 (名称, 标签) 为键，标签用于区分接口、命令等维度。
+    """
+
+    QUANTILES = (50, 95, 99)
+
+    def __init__(self, prefix: str = "exchangerate"):
+        self.prefix: str = prefix
+        self.histograms: dict[tuple[str, tuple], Histogram] = {}
+        self.counters: dict[tuple[str, tuple], float] = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict[str, str]) -> tuple[str, tuple]:
+        return name, tuple(sorted(labels.items()))
+
+    @contextmanager
+    def span(self, name: str, **labels: str):
+        """记录代码块耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def observe(self, name: str, seconds: float, **labels: str):
+        key = self._key(name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(seconds * 1000)
+
+    def incr(self, name: str, value: float = 1, **labels: str):
+        key = self._key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def counter_total(self, name: str) -> float:
+        """某计数器所有标签的合计"""
+        return sum(v for (n, _), v in self.counters.items() if n == name)
+
+    @staticmethod
+    def _format_labels(labels: tuple, extra: str = "") -> str:
+        parts = [f'{k}="{v}"' for k, v in labels]
+        if extra:
+            parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def summary(self) -> list[str]:
+        """可读的指标摘要"""
+        lines = ["⏱️ 耗时(ms) p50 / p95 / p99 (次数)"]
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            p50, p95, p99 = (histogram.percentile(q) for q in self.QUANTILES)
+            lines.append(
+                f"• {name}{self._format_labels(labels)}: "
+                f"{p50:.1f} / {p95:.1f} / {p99:.1f} ({histogram.count})"
+            )
+        lines.append("")
+        lines.append("🔢 计数")
+        for (name, labels), value in sorted(self.counters.items()):
+            lines.append(f"• {name}{self._format_labels(labels)}: {value:g}")
+        return lines
+
+    def prometheus(self) -> str:
+        """Prometheus文本格式: 耗时为summary(秒)，计数为counter"""
+        lines = []
+        names_seen = set()
+        for (name, labels), histogram in sorted(self.histograms.items()):
+            metric = self._metric_name(f"{name}_seconds")
+            if metric not in names_seen:
+                names_seen.add(metric)
+                lines.append(f"# TYPE {metric} summary")
+            for q in self.QUANTILES:
+                quantile = self._format_labels(labels, f'quantile="{q / 100}"')
+                lines.append(f"{metric}{quantile} {histogram.percentile(q) / 1000:.6f}")
+            label_str = self._format_labels(labels)
+            lines.append(f"{metric}_sum{label_str} {histogram.total / 1000:.6f}")
+            lines.append(f"{metric}_count{label_str} {histogram.count}")
+        for (name, labels), value in sorted(self.counters.items()):
+            metric = self._metric_name(f"{name}_total")
+            if metric not in names_seen:
+                names_seen.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{self._format_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def _metric_name(self, name: str) -> str:
+        return re.sub(r"[^a-zA-Z0-9_]", "_", f"{self.prefix}_{name}")
@@ -1,5 +1,21 @@
+from astrbot.api import logger
+
 import aiohttp
-from typing import Any, TypedDict
+import asyncio
+import json
+import math
+import os
+import struct
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Awaitable, Callable, TypedDict
+
+from .HistoricalStore import HistoricalStore
+from .Metrics import Metrics, record_request
+from .Provider import CircuitBreaker, RateProvider, hedged_fetch
+from .RateSnapshot import CurrencyCodes, RateSnapshot
 
 
 # 定义响应数据类型
@@ -21,62 +37,234 @@ class CurrencyInfo(TypedDict):
     name: str
 
 
-class OpenExchangeRate:
-    def __init__(self, api_key: str):
+STATE_MAGIC = b"ERS1"  # 快照状态文件魔数
+
+
+class _CachedSnapshot:
+    """缓存条目: 美元基准快照及其过期时间"""
+
+    __slots__ = ("expires_at", "snapshot", "retry_at")
+
+    def __init__(self, expires_at: float, snapshot: RateSnapshot):
+        self.expires_at: float = expires_at
+        self.snapshot: RateSnapshot = snapshot
+        self.retry_at: float = 0.0  # 后台刷新失败后，此时间之前不再刷新
+
+
+class OpenExchangeRate(RateProvider):
+    name = "openexchangerates"
+
+    def __init__(
+        self,
+        api_key: str,
+        cache_size: int = 32,
+        data_dir: str | None = None,
+        fallbacks: list[RateProvider] | None = None,
+        hedge_delay: float = 1.5,
+        stale_max_age: float = 86400,
+        metrics: Metrics | None = None,
+        **kwargs,
+    ):
+        """
+        Args:
+            api_key: OpenExchangeRates API KEY
+            cache_size: 内存快照缓存条目数
+            data_dir: 本地数据目录，用于持久化历史汇率
+            fallbacks: 备用提供方，主接口慢或失败时按顺序对冲请求
+            hedge_delay: 等待多少秒未返回后向下一个提供方发起对冲请求
+            stale_max_age: 快照过期后仍可直接返回(同时后台刷新)的最大数据年龄(秒)
+            metrics: 指标收集器，默认新建
+            **kwargs: 连接设置，见 RateProvider
+        """
+        super().__init__(**kwargs)
         self.api_key: str = api_key
         self.default_currency: str = "USD"  # 免费api默认基准货币，兼容其他api(未测试)
         self.base_url: str = "https://openexchangerates.org/api/"
-        self.session: aiohttp.ClientSession | None = None
+        self.update_interval: int = 3600  # 免费套餐每小时更新一次(秒)
+        self.cache_size: int = cache_size
+        self.stale_max_age: float = stale_max_age
+        self.metrics: Metrics = metrics or Metrics()
+        # 快照缓存: endpoint -> 缓存条目，按LRU淘汰
+        self._snapshots: OrderedDict[str, _CachedSnapshot] = OrderedDict()
+        # 所有快照共享的货币索引: 货币代码 <-> 向量下标
+        self._codes: CurrencyCodes = CurrencyCodes()
+        # 进行中的上游请求: endpoint -> Task，相同请求并发时共享同一个结果
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._background: set[asyncio.Task] = set()  # 后台刷新任务，保持引用防止被回收
+        self._currencies: dict[str, str] = {}  # 上次成功获取的货币列表
+        # 获取到新的最新汇率快照时在后台调用的回调
+        self.snapshot_listeners: list[Callable[[RateSnapshot], Awaitable[None]]] = []
+        self._notified_timestamp: int = 0  # 最近一次通知的快照时间戳
+        # 主提供方为自身，备用提供方各自带熔断器
+        self.fallbacks: list[RateProvider] = fallbacks or []
+        self.hedge_delay: float = hedge_delay
+        self.breakers: dict[str, CircuitBreaker] = {
+            provider.name: CircuitBreaker() for provider in [self, *self.fallbacks]
+        }
+        # 过去日期的汇率持久化到本地，重启后无需再次请求
+        self.historical_store: HistoricalStore | None = (
+            HistoricalStore(data_dir) if data_dir else None
+        )
+        # 其余快照(最新汇率等)保存到状态文件，插件重载后首次使用时恢复
+        self.state_path: str | None = (
+            os.path.join(data_dir, "snapshots.bin") if data_dir else None
+        )
+        self._state_loaded: bool = False
+        self._state_dirty: bool = False
+        self.state_save_delay: float = 30.0  # 缓存变化后延迟保存状态文件的秒数
+        self._save_handle: asyncio.TimerHandle | None = None
 
     async def __aenter__(self):
         """异步上下文管理器入口"""
-        self.session = aiohttp.ClientSession()
+        await self.ensure_session()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
         """异步上下文管理器出口"""
-        if self.session:
-            await self.session.close()
+        await self.close()
+
+    async def fetch_rates(self, date_str: str | None = None) -> ExchangeRatesResponse:
+        """直接请求OpenExchangeRates的美元基准汇率快照，不经过缓存"""
+        return await self._request_json(self._rates_endpoint(date_str))
 
-    async def ensure_session(self):
-        """确保会话已创建"""
-        if self.session is None:
-            self.session = aiohttp.ClientSession()
+    @staticmethod
+    def _rates_endpoint(date_str: str | None) -> str:
+        return f"historical/{date_str}.json" if date_str else "latest.json"
 
     async def check_usage_info(self) -> UsageInfo:
         """获取用户key信息"""
-        await self.ensure_session()
-        url = f"{self.base_url}usage.json?app_id={self.api_key}"
-        async with self.session.get(url) as resp:
-            data = await self._handle_response(resp)
-            return data
+        return await self._request_json("usage.json")
 
-    async def fetch_latest_rates(self, base_currency: str = "USD") -> dict[str, float]:
-        """获取最新汇率"""
-        await self.ensure_session()
-        url = f"{self.base_url}latest.json?app_id={self.api_key}"
-        async with self.session.get(url) as resp:
-            data: ExchangeRatesResponse = await self._handle_response(resp)
-            data_default = data.get("rates", {})
-            data_base = await self.base_rate_conversion(base_currency, data_default)
-            return data_base
+    async def fetch_latest_rates(
+        self, base_currency: str = "USD", targets: list[str] | None = None
+    ) -> dict[str, float]:
+        """获取最新汇率
+
+        Args:
+            base_currency: 基准货币代码，默认为USD
+            targets: 只返回这些目标货币的汇率，默认返回全部
+        """
+        snapshot = await self.fetch_latest_snapshot(base_currency)
+        return snapshot.rates(targets) if snapshot else {}
 
     async def fetch_historical_rates(
-        self, date_str: str, base_currency: str = "USD"
+        self, date_str: str, base_currency: str = "USD", targets: list[str] | None = None
     ) -> dict[str, float]:
         """获取历史汇率
 
         Args:
             date_str: 历史日期，格式为YYYY-MM-DD
             base_currency: 基准货币代码，默认为USD
+            targets: 只返回这些目标货币的汇率，默认返回全部
         """
-        await self.ensure_session()
-        url = f"{self.base_url}historical/{date_str}.json?app_id={self.api_key}"
-        async with self.session.get(url) as resp:
-            data: ExchangeRatesResponse = await self._handle_response(resp)
-            data_default = data.get("rates", {})
-            data_base = await self.base_rate_conversion(base_currency, data_default)
-            return data_base
+        snapshot = await self.fetch_historical_snapshot(date_str, base_currency)
+        return snapshot.rates(targets) if snapshot else {}
+
+    async def fetch_latest_snapshot(
+        self, base_currency: str = "USD"
+    ) -> RateSnapshot | None:
+        """获取以base_currency为基准的最新汇率快照，未找到基准货币时返回None"""
+        return self._rebase(await self._fetch_snapshot(None), base_currency)
+
+    async def fetch_historical_snapshot(
+        self, date_str: str, base_currency: str = "USD"
+    ) -> RateSnapshot | None:
+        """获取以base_currency为基准的历史汇率快照，未找到基准货币时返回None"""
+        return self._rebase(
+            await self._get_historical_snapshot(date_str), base_currency
+        )
+
+    async def convert(
+        self, amounts: list[Decimal], base_currency: str, targets: list[str]
+    ) -> dict[str, list[Decimal]]:
+        """按最新汇率把若干金额的base_currency换算为各目标货币
+
+        使用缓存的最新快照，交叉汇率每个快照每种基准货币只计算一次，
+        结果按目标货币的最小单位四舍五入，见 RateSnapshot.convert。
+        """
+        snapshot = await self._fetch_snapshot(None)
+        with self.metrics.span("convert"):
+            result = snapshot.convert(amounts, base_currency, targets)
+        if not result and base_currency not in snapshot:
+            logger.warning(f"获取{base_currency}汇率失败: 未找到基准货币 {base_currency} 的汇率")
+        return result
+
+    def missing_historical_dates(self, dates: list[str]) -> list[str]:
+        """返回内存缓存与本地存储中都没有的日期，即需要请求上游的日期"""
+        return [
+            date_str
+            for date_str in dates
+            if self._get_cached(f"historical/{date_str}.json") is None
+            and (self.historical_store is None or date_str not in self.historical_store)
+        ]
+
+    async def fetch_historical_series(
+        self,
+        dates: list[str],
+        base_currency: str,
+        targets: list[str],
+        concurrency: int = 4,
+    ) -> dict[str, RateSnapshot]:
+        """获取多个日期的历史汇率，本地缺失的日期以有限并发回填
+
+        本地已有的日期直接按列读取，不进入快照缓存，避免大范围查询挤掉最新汇率。
+
+        Args:
+            dates: 日期列表，格式为YYYY-MM-DD
+            base_currency: 基准货币代码
+            targets: 目标货币代码
+            concurrency: 回填时的最大并发请求数
+
+        Returns:
+            日期 -> 以base_currency为基准的快照，获取失败的日期不包含在内
+        """
+        codes = [base_currency, *targets]
+        missing = self.missing_historical_dates(dates)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def backfill(date_str: str):
+            # 回填只使用主接口，保证本地存储的数据完整
+            async with semaphore:
+                data = await self.fetch_rates(date_str)
+            snapshot = RateSnapshot.from_response(self._codes, data, self.name)
+            today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+            if date_str < today and self.historical_store is not None:
+                self.historical_store.put(date_str, data)
+            else:
+                # 当天(UTC)的数据仍会更新，不持久化，放入快照缓存到提供方下次更新为止
+                self._put_cached(
+                    f"historical/{date_str}.json", snapshot, self._next_update_time(snapshot)
+                )
+            return snapshot
+
+        fetched = dict(
+            zip(
+                missing,
+                await asyncio.gather(
+                    *(backfill(date_str) for date_str in missing),
+                    return_exceptions=True,
+                ),
+            )
+        )
+
+        series = {}
+        for date_str in dates:
+            snapshot = fetched.get(date_str)
+            if snapshot is None:
+                snapshot = self._get_cached(f"historical/{date_str}.json")
+            if snapshot is None and self.historical_store is not None:
+                usd_rates = self.historical_store.get_rates(date_str, codes)
+                if usd_rates is not None:
+                    snapshot = RateSnapshot.from_response(
+                        self._codes, {"rates": usd_rates}, self.name
+                    )
+            if isinstance(snapshot, Exception):
+                logger.warning(f"回填{date_str}历史汇率失败: {snapshot}")
+                continue
+            rebased = snapshot.rebase(base_currency) if snapshot else None
+            if rebased is not None:
+                series[date_str] = rebased
+        return series
 
     async def fetch_currencies(self) -> dict[str, str]:
         """获取所有支持的货币代码及其名称
@@ -89,43 +277,381 @@ class OpenExchangeRate:
                 "AMD": "Armenian Dram"
             }
         """
+        try:
+            data: CurrencyInfo = await self._request_json("currencies.json")
+        except Exception as e:
+            # 上游故障时沿用上次获取的货币列表
+            if self._currencies:
+                logger.warning(f"获取货币列表失败，使用旧数据: {e}")
+                return self._currencies
+            raise
+        self._currencies = data
+        return data
+
+    async def _get_historical_snapshot(self, date_str: str) -> RateSnapshot:
+        """获取美元基准的历史汇率快照，过去日期优先读取内存缓存与本地存储"""
+        endpoint = f"historical/{date_str}.json"
+        # 过去日期的汇率不会再变化，可以一直缓存
+        today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+        immutable = date_str < today
+        if not immutable or self.historical_store is None:
+            return await self._fetch_snapshot(date_str, immutable)
+
+        snapshot = self._get_cached(endpoint)
+        if snapshot is not None:
+            self.metrics.incr("cache_lookups", result="hit")
+            return snapshot
+        data = self.historical_store.get(date_str)
+        if data is not None:
+            self.metrics.incr("cache_lookups", result="disk")
+            snapshot = RateSnapshot.from_response(self._codes, data, self.name)
+            self._put_cached(endpoint, snapshot, float("inf"))
+        else:
+            snapshot = await self._fetch_snapshot(date_str, immutable)
+            # 备用提供方的货币不全，只持久化主接口的数据
+            if snapshot.source == self.name:
+                self.historical_store.put(date_str, snapshot.to_response())
+        return snapshot
+
+    async def _fetch_snapshot(
+        self, date_str: str | None, immutable: bool = False
+    ) -> RateSnapshot:
+        """获取美元基准的汇率快照，命中缓存时不请求上游
+
+        快照过期但数据年龄未超过stale_max_age时，直接返回旧快照并在后台刷新
+        (stale-while-revalidate)，上游限流或故障期间也会继续返回旧快照。
+
+        Args:
+            date_str: 历史日期，None表示最新汇率
+            immutable: 数据是否不会再更新(过去日期的历史汇率)
+        """
+        self._load_state()
+        endpoint = self._rates_endpoint(date_str)
+        entry = self._snapshots.get(endpoint)
+        if entry is not None:
+            self._snapshots.move_to_end(endpoint)
+            if time.time() < entry.expires_at:
+                self.metrics.incr("cache_lookups", result="hit")
+                return entry.snapshot
+            if self._is_servable_stale(entry):
+                self.metrics.incr("cache_lookups", result="stale")
+                if time.time() >= entry.retry_at:
+                    self._refresh_in_background(date_str, immutable)
+                return entry.snapshot
+
+        self.metrics.incr("cache_lookups", result="miss")
+        return await self._load_snapshot(date_str, immutable)
+
+    async def _load_snapshot(self, date_str: str | None, immutable: bool) -> RateSnapshot:
+        """从上游获取快照并写入缓存"""
+        endpoint = self._rates_endpoint(date_str)
+
+        async def fetch() -> RateSnapshot:
+            provider, data = await self._fetch_from_providers(date_str)
+            return RateSnapshot.from_response(self._codes, data, provider.name)
+
+        # 在共享任务内转换，并发等待者得到同一个快照对象
+        snapshot = await self._single_flight(f"snapshot:{endpoint}", fetch)
+        if snapshot.source != self.name:
+            # 备用数据只短暂缓存，尽快回到主接口
+            expires_at = time.time() + min(self.update_interval, 300)
+        elif immutable:
+            expires_at = float("inf")
+        else:
+            expires_at = self._next_update_time(snapshot)
+        self._put_cached(endpoint, snapshot, expires_at)
+        # 只通知主接口的更新数据: 备用提供方的数据可能较旧，来回切换会让汇率反复跳变
+        if (
+            date_str is None
+            and snapshot.source == self.name
+            and snapshot.timestamp > self._notified_timestamp
+        ):
+            self._notified_timestamp = snapshot.timestamp
+            self._notify_listeners(snapshot)
+        return snapshot
+
+    def _is_servable_stale(self, entry: _CachedSnapshot) -> bool:
+        """过期快照的数据年龄是否仍在可接受范围内"""
+        return time.time() - entry.snapshot.timestamp <= self.stale_max_age
+
+    def _refresh_in_background(self, date_str: str | None, immutable: bool):
+        """后台刷新快照，失败时保留旧快照继续服务
+
+        失败后推迟下次刷新，避免上游限流或故障期间每条消息都请求上游。
+        """
+        endpoint = self._rates_endpoint(date_str)
+        if f"snapshot:{endpoint}" in self._inflight:
+            return
+
+        async def refresh():
+            try:
+                await self._load_snapshot(date_str, immutable)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"后台刷新{endpoint}失败，继续使用旧数据: {e}")
+                entry = self._snapshots.get(endpoint)
+                if entry is not None:
+                    entry.retry_at = time.time() + min(self.update_interval, 300)
+
+        task = asyncio.ensure_future(refresh())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _notify_listeners(self, snapshot: RateSnapshot):
+        """在后台把新的最新汇率快照交给各回调，回调失败不影响查询"""
+        for listener in self.snapshot_listeners:
+
+            async def notify(listener=listener):
+                try:
+                    await listener(snapshot)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.warning(f"最新汇率回调失败: {e}")
+
+            task = asyncio.ensure_future(notify())
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+    async def _fetch_from_providers(
+        self, date_str: str | None
+    ) -> tuple[RateProvider, ExchangeRatesResponse]:
+        """从主接口获取快照，配置了备用提供方时进行对冲请求与熔断"""
+        if not self.fallbacks:
+            return self, await self.fetch_rates(date_str)
+        provider, data = await hedged_fetch(
+            [self, *self.fallbacks], self.breakers, date_str, self.hedge_delay
+        )
+        if provider is not self:
+            self.metrics.incr("fallback_used", provider=provider.name)
+            logger.warning(f"主接口响应慢或失败，使用 {provider.name} 的汇率数据")
+        return provider, data
+
+    async def _request_json(self, endpoint: str) -> Any:
+        """请求上游接口并解析JSON，相同endpoint的并发请求合并为一次
+
+        Args:
+            endpoint: 接口路径(可含查询参数)，同时作为去重的键
+        """
+        return await self._single_flight(endpoint, lambda: self._do_request(endpoint))
+
+    async def _single_flight(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        """相同key的并发调用共享同一个进行中的任务"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+
+            def _done(finished: asyncio.Task):
+                if self._inflight.get(key) is finished:
+                    del self._inflight[key]
+                # 所有等待者都已取消时避免"exception was never retrieved"警告
+                if not finished.cancelled():
+                    finished.exception()
+
+            task.add_done_callback(_done)
+        # shield: 单个调用方被取消不影响其他等待同一请求的调用方
+        return await asyncio.shield(task)
+
+    async def _do_request(self, endpoint: str) -> Any:
+        """实际发起一次上游请求"""
         await self.ensure_session()
-        url = f"{self.base_url}currencies.json?app_id={self.api_key}"
-        async with self.session.get(url) as resp:
-            data: CurrencyInfo = await self._handle_response(resp)
-            return data
+        separator = "&" if "?" in endpoint else "?"
+        url = f"{self.base_url}{endpoint}{separator}app_id={self.api_key}"
+        kind = endpoint.split("/")[0].split("?")[0].removesuffix(".json")
+        self.metrics.incr("upstream_requests", endpoint=kind)
+        record_request()
+        with self.metrics.span("upstream_request", endpoint=kind):
+            async with self.session.get(url) as resp:
+                return await self._handle_response(resp)
+
+    def _next_update_time(self, snapshot: RateSnapshot) -> float:
+        """根据快照时间戳推算提供方下一次更新数据的时间"""
+        now = time.time()
+        timestamp = snapshot.timestamp or now
+        # 上游发布延迟时时间戳可能已过期，此时至少保留一分钟，避免反复请求
+        return max(timestamp + self.update_interval, now + 60)
+
+    def _rebase(self, snapshot: RateSnapshot, base_currency: str) -> RateSnapshot | None:
+        """换算到base_currency的快照视图，不复制汇率向量"""
+        with self.metrics.span("base_rate_conversion"):
+            rebased = snapshot.rebase(base_currency)
+        if rebased is None:
+            logger.warning(f"获取{base_currency}汇率失败: 未找到基准货币 {base_currency} 的汇率")
+        return rebased
+
+    def latest_timestamp(self) -> int | None:
+        """返回缓存中最新汇率快照的时间戳"""
+        return self._snapshot_timestamp("latest.json")
+
+    def historical_timestamp(self, date_str: str) -> int | None:
+        """返回缓存中某日历史汇率快照的时间戳"""
+        return self._snapshot_timestamp(f"historical/{date_str}.json")
+
+    def is_latest_stale(self) -> bool:
+        """缓存中的最新汇率是否已过期(正在使用旧数据)"""
+        entry = self._snapshots.get("latest.json")
+        return entry is not None and time.time() >= entry.expires_at
+
+    def _snapshot_timestamp(self, endpoint: str) -> int | None:
+        entry = self._snapshots.get(endpoint)
+        return entry.snapshot.timestamp if entry else None
+
+    def cache_expires_at(self, endpoint: str) -> float | None:
+        """返回缓存快照的过期时间戳，未缓存时返回None"""
+        entry = self._snapshots.get(endpoint)
+        return entry.expires_at if entry else None
+
+    def _get_cached(self, key: str) -> RateSnapshot | None:
+        """读取未过期的缓存快照，过期快照保留以便stale-while-revalidate"""
+        self._load_state()
+        entry = self._snapshots.get(key)
+        if entry is None or time.time() >= entry.expires_at:
+            return None
+        self._snapshots.move_to_end(key)
+        return entry.snapshot
+
+    def _put_cached(self, key: str, snapshot: RateSnapshot, expires_at: float) -> None:
+        """写入缓存快照，超出容量时淘汰最久未使用的条目"""
+        entry = self._snapshots.get(key)
+        if entry is not None and entry.snapshot is snapshot:
+            entry.expires_at = expires_at
+        else:
+            self._snapshots[key] = _CachedSnapshot(expires_at, snapshot)
+        self._state_dirty = True
+        self._schedule_save()
+        self._snapshots.move_to_end(key)
+        while len(self._snapshots) > self.cache_size:
+            self._snapshots.popitem(last=False)
+
+    def _schedule_save(self):
+        """延迟保存状态文件，期间的多次缓存变化合并为一次写入"""
+        if not self.state_path or self._save_handle is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # 没有运行中的事件循环时由close保存
+        self._save_handle = loop.call_later(self.state_save_delay, self._flush_state)
+
+    def _flush_state(self):
+        self._save_handle = None
+        self.save_state()
+
+    def _load_state(self):
+        """首次使用缓存时从状态文件恢复快照，已在缓存中的条目不会被覆盖
+
+        文件格式: 4字节魔数、4字节头部长度、JSON头部(货币代码与各条目元数据)，
+        之后依次为各条目的小端float64汇率。
+        """
+        if self._state_loaded:
+            return
+        self._state_loaded = True
+        if not self.state_path or not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, "rb") as f:
+                blob = f.read()
+            if blob[:4] != STATE_MAGIC:
+                raise ValueError("文件格式不正确")
+            (header_size,) = struct.unpack_from("<I", blob, 4)
+            offset = 8 + header_size
+            header = json.loads(blob[8:offset])
+            codes: list[str] = header["codes"]
+            for item in header["entries"]:
+                count = item["count"]
+                values = struct.unpack_from(f"<{count}d", blob, offset)
+                offset += count * 8
+                if item["endpoint"] in self._snapshots:
+                    continue
+                rates = {
+                    code: value
+                    for code, value in zip(codes, values)
+                    if not math.isnan(value)
+                }
+                snapshot = RateSnapshot.from_response(
+                    self._codes,
+                    {"timestamp": item["timestamp"], "base": item["base"], "rates": rates},
+                    item["source"],
+                )
+                self._snapshots[item["endpoint"]] = _CachedSnapshot(
+                    item["expires_at"], snapshot
+                )
+            while len(self._snapshots) > self.cache_size:
+                self._snapshots.popitem(last=False)
+        except (OSError, ValueError, KeyError, TypeError, struct.error) as e:
+            logger.warning(f"读取快照状态失败: {e}")
+
+    def save_state(self):
+        """把缓存快照写入状态文件，缓存未变化时跳过
+
+        本地历史存储中已有的日期不再重复保存。
+        """
+        if not self.state_path or not self._state_dirty:
+            return
+        entries, chunks = [], []
+        for endpoint, entry in self._snapshots.items():
+            date_str = endpoint.removeprefix("historical/").removesuffix(".json")
+            if (
+                endpoint.startswith("historical/")
+                and self.historical_store is not None
+                and date_str in self.historical_store
+            ):
+                continue
+            snapshot = entry.snapshot
+            entries.append({
+                "endpoint": endpoint,
+                "timestamp": snapshot.timestamp,
+                "base": snapshot.base,
+                "source": snapshot.source,
+                "expires_at": entry.expires_at,
+                "count": len(snapshot.values),
+            })
+            chunks.append(struct.pack(f"<{len(snapshot.values)}d", *snapshot.values))
+        header = json.dumps({"codes": self._codes.codes, "entries": entries}).encode()
+
+        try:
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+            tmp_path = f"{self.state_path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(STATE_MAGIC + struct.pack("<I", len(header)) + header)
+                f.writelines(chunks)
+            os.replace(tmp_path, self.state_path)
+            self._state_dirty = False
+        except OSError as e:
+            logger.error(f"保存快照状态失败: {e}")
 
     async def _handle_response(self, response: aiohttp.ClientResponse) -> Any:
         """统一处理API响应"""
-        if response.status != 200:
-            error = await response.text()
-            raise Exception(f"API请求失败: {response.status} - {error}")
-        return await response.json()
+        with self.metrics.span("handle_response"):
+            if response.status != 200:
+                self.metrics.incr("upstream_errors", status=str(response.status))
+                error = await response.text()
+                raise Exception(f"API请求失败: {response.status} - {error}")
+            body = await response.read()
+        with self.metrics.span("json_decode"):
+            return json.loads(body)
 
     async def base_rate_conversion(
         self, base_currency: str, data_default: dict[str, float]
     ) -> dict[str, float]:
-        """将默认美元货币汇率转换为基础货币汇率"""
-        if base_currency == self.default_currency:
-            return data_default
-        else:
-            rate_dict = {}
-            try:
-                base_rate = data_default.get(base_currency)
-                if base_rate is None:
-                    raise ValueError(f"未找到基准货币 {base_currency} 的汇率")
-
-                for key, value in data_default.items():
-                    if key == base_currency:
-                        rate_dict[self.default_currency] = 1.0 / base_rate
-                    else:
-                        rate_dict[key] = value / base_rate
-                return rate_dict
-            except Exception as e:
-                print(f"获取{base_currency}汇率失败: {e}")
-                return {}
+        """将默认美元货币汇率转换为基础货币汇率，兼容旧接口，内部使用快照视图换算"""
+        codes = CurrencyCodes()
+        snapshot = RateSnapshot(codes, codes.vectorize(data_default), 0, self.default_currency)
+        rebased = self._rebase(snapshot, base_currency)
+        return rebased.rates() if rebased else {}
 
     async def close(self):
-        """关闭HTTP会话"""
-        if self.session:
-            await self.session.close()
+        """保存快照状态并关闭HTTP会话及其连接池"""
+        for task in [*self._inflight.values(), *self._background]:
+            task.cancel()
+        if self._save_handle is not None:
+            self._save_handle.cancel()
+            self._save_handle = None
+        self.save_state()
+        await super().close()
+        for provider in self.fallbacks:
+            await provider.close()
+        if self.historical_store:
+            self.historical_store.close()
@@ -0,0 +1,79 @@
+from astrbot.api import logger
+
+from .OpenExchangeRate import OpenExchangeRate
+from .QuotaBudget import QuotaBudget
+
+from datetime import datetime, timedelta
+import asyncio
+import time
+
+
+class RatePrefetcher:
+    """后台预取任务，让最新汇率与past_day天前的历史汇率常驻缓存
+
+    按额度预算给出的刷新间隔在上游发布新数据后刷新latest，跨天时预载新的历史快照，
+    使用户请求只读缓存，不包含网络耗时。每轮预取后保存快照状态。
+    """
+
+    GRACE_SECONDS = 30  # 上游发布新数据后稍等片刻再刷新
+    MIN_SLEEP = 60
+
+    def __init__(self, client: OpenExchangeRate, budget: QuotaBudget, past_day: int):
+        self.client: OpenExchangeRate = client
+        self.budget: QuotaBudget = budget
+        self.past_day: int = past_day
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        """启动后台任务"""
+        if self._task is not None and not self._task.done():
+            return
+        try:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        except RuntimeError:
+            logger.warning("当前没有运行中的事件循环，汇率预取未启动")
+
+    async def stop(self):
+        """取消后台任务并等待其退出"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await self.prefetch()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"汇率预取失败: {str(e)}")
+            # 定期保存快照，插件重载或异常退出后仍可热启动
+            self.client.save_state()
+            await asyncio.sleep(self._seconds_until_next())
+
+    async def prefetch(self):
+        """预取最新汇率与past_day天前的历史汇率"""
+        past_date = datetime.now() - timedelta(days=self.past_day)
+        await self.client.fetch_latest_snapshot()
+        await self.client.fetch_historical_snapshot(past_date.strftime("%Y-%m-%d"))
+        logger.debug("汇率预取完成")
+
+    def _seconds_until_next(self) -> float:
+        """距离下一次预取的秒数: 上游下次更新或本地跨天，取较早者"""
+        now = datetime.now()
+        tomorrow = (now + timedelta(days=1)).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        delay = (tomorrow - now).total_seconds() + 1
+
+        expires_at = self.client.cache_expires_at("latest.json")
+        if expires_at is not None:
+            delay = min(delay, expires_at - time.time() + self.GRACE_SECONDS)
+        else:
+            delay = min(delay, self.client.update_interval)
+        return max(delay, self.MIN_SLEEP)
@@ -0,0 +1,231 @@
+import aiohttp
+import asyncio
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from typing import Any
+
+try:
+    import brotli  # noqa: F401  安装brotli后aiohttp可解压br编码的响应
+
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+
+class RateProvider(ABC):
+    """汇率数据提供方接口
+
+    fetch_rates 统一返回美元基准的原始快照:
+        {"timestamp": 1700000000, "base": "USD", "rates": {"CNY": 7.2, ...}}
+    """
+
+    name: str = ""
+    supports_historical: bool = True  # 是否支持按日期查询历史汇率
+
+    def __init__(
+        self, timeout: float = 10.0, pool_size: int = 10, compression: bool = True
+    ):
+        self.session: aiohttp.ClientSession | None = None
+        self.timeout: float = timeout  # 单次请求总超时(秒)
+        self.pool_size: int = pool_size  # 连接池最大连接数
+        self.compression: bool = compression  # 是否协商gzip/br压缩
+
+    @abstractmethod
+    async def fetch_rates(self, date_str: str | None = None) -> dict[str, Any]:
+        """获取美元基准汇率快照
+
+        Args:
+            date_str: 历史日期，格式为YYYY-MM-DD，None表示最新汇率
+        """
+
+    async def ensure_session(self):
+        """确保会话已创建"""
+        if self.session is None or self.session.closed:
+            self.session = self._create_session()
+
+    def _create_session(self) -> aiohttp.ClientSession:
+        """创建带连接池、DNS缓存与超时设置的会话，所有请求复用keep-alive连接"""
+        connector = aiohttp.TCPConnector(
+            limit=self.pool_size,
+            limit_per_host=self.pool_size,
+            ttl_dns_cache=300,
+            keepalive_timeout=60,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=self.timeout,
+            connect=min(self.timeout, 5.0),
+            sock_read=self.timeout,
+        )
+        headers = {
+            "Accept-Encoding": ACCEPT_ENCODING if self.compression else "identity"
+        }
+        return aiohttp.ClientSession(
+            connector=connector, timeout=timeout, headers=headers
+        )
+
+    async def _get_json(self, url: str) -> Any:
+        """GET请求并解析JSON，非200状态抛出异常"""
+        await self.ensure_session()
+        async with self.session.get(url) as resp:
+            if resp.status != 200:
+                error = await resp.text()
+                raise Exception(f"{self.name} 请求失败: {resp.status} - {error}")
+            return await resp.json()
+
+    async def close(self):
+        """关闭HTTP会话及其连接池"""
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+
+class FrankfurterProvider(RateProvider):
+    """Frankfurter免费接口，数据来自欧洲央行，约30种货币，工作日更新"""
+
+    name = "frankfurter"
+
+    def __init__(self, base_url: str = "https://api.frankfurter.app/", **kwargs):
+        super().__init__(**kwargs)
+        self.base_url: str = base_url
+
+    async def fetch_rates(self, date_str: str | None = None) -> dict[str, Any]:
+        data = await self._get_json(f"{self.base_url}{date_str or 'latest'}?from=USD")
+        rates = dict(data.get("rates", {}))
+        rates["USD"] = 1.0
+        date = datetime.strptime(data["date"], "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        return {"timestamp": int(date.timestamp()), "base": "USD", "rates": rates}
+
+
+class ErApiProvider(RateProvider):
+    """ExchangeRate-API开放接口，无需key，约160种货币，每日更新，仅支持最新汇率"""
+
+    name = "er-api"
+    supports_historical = False
+
+    def __init__(self, base_url: str = "https://open.er-api.com/v6/", **kwargs):
+        super().__init__(**kwargs)
+        self.base_url: str = base_url
+
+    async def fetch_rates(self, date_str: str | None = None) -> dict[str, Any]:
+        data = await self._get_json(f"{self.base_url}latest/USD")
+        if data.get("result") != "success":
+            raise Exception(f"{self.name} 请求失败: {data.get('error-type', data)}")
+        return {
+            "timestamp": data.get("time_last_update_unix", 0),
+            "base": "USD",
+            "rates": data.get("rates", {}),
+        }
+
+
+# 可作为备用的提供方，键为配置中的名称
+PROVIDERS: dict[str, type[RateProvider]] = {
+    FrankfurterProvider.name: FrankfurterProvider,
+    ErApiProvider.name: ErApiProvider,
+}
+
+
+class CircuitBreaker:
+    """熔断器: 连续失败达到阈值后打开，冷却期内跳过该提供方，冷却后放行一次试探"""
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 60.0):
+        self.failure_threshold: int = failure_threshold
+        self.reset_timeout: float = reset_timeout
+        self.failures: int = 0
+        self.opened_at: float | None = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        """是否允许向该提供方发起请求"""
+        if self.opened_at is None:
+            return True
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            # 半开: 放行一次试探，失败后重新计时
+            self.opened_at = time.monotonic()
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+async def hedged_fetch(
+    providers: list[RateProvider],
+    breakers: dict[str, CircuitBreaker],
+    date_str: str | None,
+    hedge_delay: float,
+) -> tuple[RateProvider, dict[str, Any]]:
+    """按顺序向提供方请求汇率，取最先成功的结果
+
+    先请求第一个可用提供方，超过hedge_delay秒仍未返回或请求失败时，
+    再向下一个提供方发起对冲请求。熔断中的提供方会被跳过，
+    若全部熔断则仍尝试第一个提供方。
+
+    Returns:
+        (提供数据的提供方, 美元基准汇率快照)
+    """
+    candidates = [
+        provider
+        for provider in providers
+        if date_str is None or provider.supports_historical
+    ] or providers[:1]
+    queue = iter(candidates)
+    pending: set[asyncio.Task] = set()
+    errors: list[BaseException] = []
+
+    async def call(provider: RateProvider):
+        breaker = breakers[provider.name]
+        try:
+            data = await provider.fetch_rates(date_str)
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        return provider, data
+
+    def launch() -> bool:
+        # 真正要发起请求时才询问熔断器，避免提前消耗半开状态的试探机会
+        for provider in queue:
+            if breakers[provider.name].allow():
+                pending.add(asyncio.ensure_future(call(provider)))
+                return True
+        if not pending and not errors:
+            # 全部熔断时仍尝试第一个提供方
+            pending.add(asyncio.ensure_future(call(candidates[0])))
+            return True
+        return False
+
+    launch()
+    try:
+        while pending:
+            done, _ = await asyncio.wait(
+                pending, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                launch()  # 超过延迟阈值仍未返回，发起对冲请求
+                continue
+            failed = False
+            for task in done:
+                pending.discard(task)
+                if task.exception() is None:
+                    return task.result()
+                errors.append(task.exception())
+                failed = True
+            if failed:
+                launch()  # 有请求失败时立即尝试下一个提供方
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if errors:
+        raise errors[0]
+    raise Exception("没有可用的汇率提供方")
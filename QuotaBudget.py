@@ -0,0 +1,150 @@
+from astrbot.api import logger
+
+from .OpenExchangeRate import OpenExchangeRate, UsageInfo
+
+from datetime import datetime
+import asyncio
+import re
+import time
+
+
+def parse_update_frequency(value: str | int | None, default: int = 3600) -> int:
+    """解析usage接口返回的更新频率，如 "3600s"、"30m"、"1h"，返回秒数"""
+    if isinstance(value, (int, float)):
+        return int(value) if value > 0 else default
+    match = re.fullmatch(r"\s*(\d+)\s*([smh]?)\s*", str(value or ""))
+    if not match:
+        return default
+    seconds = int(match.group(1)) * {"": 1, "s": 1, "m": 60, "h": 3600}[match.group(2)]
+    return seconds or default
+
+
+class QuotaBudget:
+    """额度预算控制器
+
+    在独立的后台任务中定期读取usage接口(与是否启用预取无关)，
+    按剩余额度与剩余天数推算每小时允许的请求数，
+    额度紧张时按比例拉长缓存有效期(同时也拉长了后台预取间隔)，
+    避免月中耗尽额度。
+    """
+
+    POLL_INTERVAL = 6 * 3600  # 轮询usage的间隔(秒)
+    RETRY_INTERVAL = 300  # 轮询失败后的重试间隔(秒)
+    SAFETY_RATIO = 0.8  # 只规划剩余额度的80%，其余留给缓存未命中的查询
+    MAX_SCALE = 24.0  # 缓存有效期最多拉长到套餐更新间隔的24倍
+    BACKFILL_SHARE = 0.25  # 单次历史回填最多使用富余额度的比例
+
+    def __init__(self, client: OpenExchangeRate):
+        self.client: OpenExchangeRate = client
+        self.base_interval: int = client.update_interval  # 套餐更新间隔(秒)
+        self.scale: float = 1.0  # 缓存有效期倍数
+        self.allowed_per_hour: float | None = None  # 每小时允许的请求数
+        self.requests_remaining: int | None = None  # 本月剩余请求数，无限额时为None
+        self.hours_left: float = 0.0  # 本月剩余小时数
+        self.unlimited: bool = False  # 是否为无限额套餐
+        self.last_decision: str = "尚未获取额度信息"
+        self.updated_at: float = 0.0
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        """启动定期轮询usage的后台任务"""
+        if self._task is not None and not self._task.done():
+            return
+        try:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        except RuntimeError:
+            logger.warning("当前没有运行中的事件循环，额度轮询未启动")
+
+    async def stop(self):
+        """取消后台任务并等待其退出"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            if self.is_due():
+                await self.refresh()
+            delay = self.POLL_INTERVAL - (time.time() - self.updated_at)
+            await asyncio.sleep(max(delay, self.RETRY_INTERVAL))
+
+    def is_due(self) -> bool:
+        """是否到了重新轮询usage的时间"""
+        return time.time() - self.updated_at >= self.POLL_INTERVAL
+
+    async def refresh(self):
+        """轮询usage接口并更新预算"""
+        try:
+            usage_info = await self.client.check_usage_info()
+        except Exception as e:
+            logger.warning(f"获取API额度信息失败，沿用当前预算: {str(e)}")
+            return
+        self.update(usage_info)
+
+    def update(self, usage_info: UsageInfo):
+        """根据usage信息重新计算预算，并调整客户端缓存有效期"""
+        data = usage_info.get("data", {})
+        usage_data = data.get("usage", {})
+        plan_data = data.get("plan", {})
+        self.base_interval = parse_update_frequency(plan_data.get("update_frequency"))
+        self.updated_at = time.time()
+
+        remaining = usage_data.get("requests_remaining", 0)
+        days_remaining = usage_data.get("days_remaining", 0)
+        # 刷新latest所需的每小时请求数，外加每天一次历史快照
+        needed_per_hour = 3600 / self.base_interval + 1 / 24
+
+        if remaining < 0 or usage_data.get("requests_quota", 0) < 0:
+            # 无限额套餐
+            self.unlimited = True
+            self.allowed_per_hour = None
+            self.requests_remaining = None
+            self.scale = 1.0
+            decision = "无限额度，按套餐频率刷新"
+        else:
+            self.unlimited = False
+            self.requests_remaining = remaining
+            hours_left = self.hours_left = max(days_remaining, 1) * 24
+            self.allowed_per_hour = remaining * self.SAFETY_RATIO / hours_left
+            if self.allowed_per_hour <= 0:
+                self.scale = self.MAX_SCALE
+            else:
+                self.scale = min(
+                    max(needed_per_hour / self.allowed_per_hour, 1.0), self.MAX_SCALE
+                )
+            decision = (
+                f"剩余{remaining}次/{days_remaining}天，"
+                f"允许{self.allowed_per_hour:.2f}次/小时，"
+                f"缓存有效期x{self.scale:.1f}"
+            )
+
+        interval = int(self.base_interval * self.scale)
+        logger.info(f"汇率额度预算: {decision}，刷新间隔{interval}秒")
+        self.client.update_interval = interval
+        self.last_decision = f"{decision} ({datetime.now().strftime('%m-%d %H:%M')})"
+
+    def backfill_allowance(self) -> float | None:
+        """单次历史回填最多可发起的请求数，尚未获取额度信息时返回None
+
+        只使用规划额度(剩余额度的SAFETY_RATIO)中、按当前刷新间隔维持到月底之外的富余部分，
+        且单次不超过富余部分的BACKFILL_SHARE，预留额度不会被回填占用。
+        """
+        if self.unlimited:
+            return float("inf")
+        if self.requests_remaining is None:
+            return None
+        needed_per_hour = 3600 / self.client.update_interval + 1 / 24
+        surplus = (
+            self.requests_remaining * self.SAFETY_RATIO - needed_per_hour * self.hours_left
+        )
+        return max(int(surplus * self.BACKFILL_SHARE), 0)
+
+    def spend(self, requests: int):
+        """记录已发起的请求，在下次轮询usage前扣减剩余额度"""
+        if self.requests_remaining is not None:
+            self.requests_remaining = max(self.requests_remaining - requests, 0)
@@ -0,0 +1,292 @@
+from astrbot.api import logger
+
+import bisect
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any
+
+from .RateSnapshot import RateSnapshot
+
+ABOVE = "above"  # 汇率向上穿过阈值
+BELOW = "below"  # 汇率向下穿过阈值
+MOVE = "move"  # 相对前一日的涨跌幅超过百分比
+
+
+class AlertRule:
+    """一条汇率提醒规则"""
+
+    __slots__ = ("id", "origin", "base", "quote", "kind", "value", "created_at", "last_fired")
+
+    def __init__(
+        self,
+        id: int,
+        origin: str,
+        base: str,
+        quote: str,
+        kind: str,
+        value: float,
+        created_at: float = 0.0,
+        last_fired: str = "",
+    ):
+        self.id: int = id
+        self.origin: str = origin  # 订阅所在会话(unified_msg_origin)
+        self.base: str = base
+        self.quote: str = quote
+        self.kind: str = kind
+        self.value: float = value  # 阈值或涨跌幅百分比
+        self.created_at: float = created_at
+        self.last_fired: str = last_fired  # 最近一次触发的日期(UTC)，涨跌幅规则每天只提醒一次
+
+    def describe(self) -> str:
+        pair = f"{self.base}→{self.quote}"
+        if self.kind == ABOVE:
+            return f"{pair} 高于 {self.value:g}"
+        if self.kind == BELOW:
+            return f"{pair} 低于 {self.value:g}"
+        return f"{pair} 单日涨跌超过 {self.value:g}%"
+
+    def to_dict(self) -> dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "AlertRule":
+        return cls(**{name: data[name] for name in cls.__slots__ if name in data})
+
+
+class _SortedRules:
+    """按数值排序的规则id，用二分查找取出一个数值区间内的规则"""
+
+    __slots__ = ("values", "ids")
+
+    def __init__(self):
+        self.values: list[float] = []
+        self.ids: list[int] = []
+
+    def add(self, value: float, rule_id: int):
+        index = bisect.bisect_right(self.values, value)
+        self.values.insert(index, value)
+        self.ids.insert(index, rule_id)
+
+    def remove(self, value: float, rule_id: int):
+        index = bisect.bisect_left(self.values, value)
+        while index < len(self.ids) and self.ids[index] != rule_id:
+            index += 1
+        if index < len(self.ids):
+            del self.values[index]
+            del self.ids[index]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+class PairAlerts:
+    """同一货币对的全部规则及上次检查时的汇率"""
+
+    __slots__ = ("above", "below", "moves", "last_rate")
+
+    def __init__(self, last_rate: float | None = None):
+        self.above: _SortedRules = _SortedRules()
+        self.below: _SortedRules = _SortedRules()
+        self.moves: _SortedRules = _SortedRules()
+        self.last_rate: float | None = last_rate
+
+    def _bucket(self, kind: str) -> _SortedRules:
+        return {ABOVE: self.above, BELOW: self.below}.get(kind, self.moves)
+
+    def add(self, rule: AlertRule):
+        self._bucket(rule.kind).add(rule.value, rule.id)
+
+    def remove(self, rule: AlertRule):
+        self._bucket(rule.kind).remove(rule.value, rule.id)
+
+    def __len__(self) -> int:
+        return len(self.above) + len(self.below) + len(self.moves)
+
+    def crossed(self, rate: float) -> list[int]:
+        """从上次汇率变化到rate时被穿过的阈值规则，并记录rate为新的上次汇率"""
+        previous, self.last_rate = self.last_rate, rate
+        if previous is None or rate == previous:
+            return []
+        if rate > previous:
+            # 向上穿过: previous <= 阈值 < rate
+            values = self.above.values
+            start = bisect.bisect_left(values, previous)
+            return self.above.ids[start : bisect.bisect_left(values, rate, start)]
+        # 向下穿过: rate < 阈值 <= previous
+        values = self.below.values
+        start = bisect.bisect_right(values, rate)
+        return self.below.ids[start : bisect.bisect_right(values, previous, start)]
+
+    def moved(self, change_percent: float) -> list[int]:
+        """涨跌幅绝对值达到阈值的涨跌幅规则"""
+        return self.moves.ids[: bisect.bisect_right(self.moves.values, abs(change_percent))]
+
+
+class AlertBook:
+    """汇率提醒订阅簿
+
+    规则按货币对索引，每个货币对内的阈值保持有序。每次拿到新的最新汇率快照时，
+    每个货币对只取一次汇率，再二分查找出自上次检查以来被穿过的阈值，
+    因此一次刷新的开销与货币对数量及触发的规则数相关，而与订阅总数无关。
+    规则持久化到本地，首次使用时加载。
+    """
+
+    MAX_RULES_PER_SESSION = 20
+
+    def __init__(self, data_dir: str | None = None):
+        self.path: str | None = os.path.join(data_dir, "alerts.json") if data_dir else None
+        self.rules: dict[int, AlertRule] = {}
+        self.pairs: dict[tuple[str, str], PairAlerts] = {}
+        self.next_id: int = 1
+        self._loaded: bool = False
+
+    def _load(self):
+        """延迟加载已保存的规则"""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            last_rates: dict[str, float] = data.get("last_rates", {})
+            for item in data.get("rules", []):
+                rule = AlertRule.from_dict(item)
+                self._index(rule, last_rates.get(f"{rule.base}/{rule.quote}"))
+            self.next_id = max(data.get("next_id", 1), max(self.rules, default=0) + 1)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"读取汇率提醒失败: {e}")
+            self.rules, self.pairs = {}, {}
+
+    def __len__(self) -> int:
+        self._load()
+        return len(self.rules)
+
+    def _index(self, rule: AlertRule, last_rate: float | None = None):
+        self.rules[rule.id] = rule
+        pair = self.pairs.get((rule.base, rule.quote))
+        if pair is None:
+            pair = self.pairs[(rule.base, rule.quote)] = PairAlerts(last_rate)
+        pair.add(rule)
+
+    def save(self):
+        """原子写入全部规则与各货币对上次检查时的汇率"""
+        if not self.path:
+            return
+        data = {
+            "next_id": self.next_id,
+            "rules": [rule.to_dict() for rule in self.rules.values()],
+            "last_rates": {
+                f"{base}/{quote}": pair.last_rate
+                for (base, quote), pair in self.pairs.items()
+                if pair.last_rate is not None
+            },
+        }
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"保存汇率提醒失败: {e}")
+
+    def add(
+        self,
+        origin: str,
+        base: str,
+        quote: str,
+        kind: str,
+        value: float,
+        current_rate: float | None = None,
+    ) -> AlertRule:
+        """添加规则，current_rate作为货币对尚无记录时的穿越判断起点
+
+        Raises:
+            ValueError: 会话的规则数已达上限
+        """
+        self._load()
+        if len(self.session_rules(origin)) >= self.MAX_RULES_PER_SESSION:
+            raise ValueError(f"每个会话最多订阅{self.MAX_RULES_PER_SESSION}条提醒")
+        rule = AlertRule(self.next_id, origin, base, quote, kind, value, time.time())
+        self.next_id += 1
+        self._index(rule, current_rate)
+        self.save()
+        return rule
+
+    def remove(self, origin: str, rule_id: int | None = None) -> int:
+        """删除会话的指定规则，rule_id为None时删除会话全部规则，返回删除数量"""
+        self._load()
+        targets = [
+            rule
+            for rule in self.session_rules(origin)
+            if rule_id is None or rule.id == rule_id
+        ]
+        for rule in targets:
+            del self.rules[rule.id]
+            key = (rule.base, rule.quote)
+            self.pairs[key].remove(rule)
+            if not self.pairs[key]:
+                del self.pairs[key]
+        if targets:
+            self.save()
+        return len(targets)
+
+    def session_rules(self, origin: str) -> list[AlertRule]:
+        """会话的全部规则，按id排序"""
+        self._load()
+        return sorted(
+            (rule for rule in self.rules.values() if rule.origin == origin),
+            key=lambda rule: rule.id,
+        )
+
+    def has_move_rules(self) -> bool:
+        self._load()
+        return any(pair.moves for pair in self.pairs.values())
+
+    def evaluate(
+        self, latest: RateSnapshot, reference: RateSnapshot | None = None
+    ) -> dict[str, list[str]]:
+        """用最新快照批量检查全部规则
+
+        Args:
+            latest: 最新汇率快照
+            reference: 前一日的汇率快照，用于涨跌幅规则，None时跳过涨跌幅规则
+
+        Returns:
+            会话 -> 提醒文本列表
+        """
+        self._load()
+        day = datetime.fromtimestamp(latest.timestamp, timezone.utc).strftime("%Y-%m-%d")
+        messages: dict[str, list[str]] = {}
+
+        for (base, quote), pair in self.pairs.items():
+            rate = latest.pair(base, quote)
+            if rate is None:
+                continue
+            for rule_id in pair.crossed(rate):
+                rule = self.rules[rule_id]
+                rule.last_fired = day
+                messages.setdefault(rule.origin, []).append(
+                    f"🔔 #{rule.id} {rule.describe()}，当前 1 {base} = {rate:.4f} {quote}"
+                )
+
+            reference_rate = reference.pair(base, quote) if reference and pair.moves else None
+            if not reference_rate:
+                continue
+            change = (rate - reference_rate) / reference_rate * 100
+            for rule_id in pair.moved(change):
+                rule = self.rules[rule_id]
+                if rule.last_fired == day:
+                    continue
+                rule.last_fired = day
+                messages.setdefault(rule.origin, []).append(
+                    f"🔔 #{rule.id} {rule.describe()}，当前 1 {base} = {rate:.4f} {quote} ({change:+.2f}%)"
+                )
+
+        if self.pairs:
+            self.save()
+        return messages
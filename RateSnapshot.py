@@ -0,0 +1,173 @@
+import math
+from array import array
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any
+
+# ISO 4217 中小数位数不是2的货币，换算结果按此四舍五入
+MINOR_UNITS: dict[str, int] = {
+    "BIF": 0, "CLP": 0, "DJF": 0, "GNF": 0, "ISK": 0, "JPY": 0, "KMF": 0,
+    "KRW": 0, "PYG": 0, "RWF": 0, "UGX": 0, "VND": 0, "VUV": 0, "XAF": 0,
+    "XOF": 0, "XPF": 0,
+    "BHD": 3, "IQD": 3, "JOD": 3, "KWD": 3, "LYD": 3, "OMR": 3, "TND": 3,
+    "BTC": 8,
+}
+
+
+def round_amount(code: str, amount: Decimal) -> Decimal:
+    """按货币的最小单位四舍五入"""
+    return amount.quantize(Decimal(1).scaleb(-MINOR_UNITS.get(code, 2)), ROUND_HALF_UP)
+
+
+class CurrencyCodes:
+    """快照共享的货币索引: 货币代码 <-> 向量下标，只追加不删除"""
+
+    __slots__ = ("codes", "positions")
+
+    def __init__(self):
+        self.codes: list[str] = []  # 下标 -> 货币代码
+        self.positions: dict[str, int] = {}  # 货币代码 -> 下标
+
+    def vectorize(self, rates: dict[str, float]) -> array:
+        """按索引把汇率字典转换为float64向量，缺失值为NaN，新货币追加到索引末尾"""
+        for code in rates:
+            if code not in self.positions:
+                self.positions[code] = len(self.codes)
+                self.codes.append(code)
+        values = array("d", [math.nan]) * len(self.codes)
+        for code, value in rates.items():
+            values[self.positions[code]] = value
+        return values
+
+
+class RateSnapshot:
+    """某一时刻的汇率快照
+
+    汇率按共享货币索引存放在float64向量中(每种货币8字节)，所有快照共用同一份索引。
+    换算到其他基准货币时不复制向量，只生成记录除数的视图，取值时再相除，
+    因此换算与按货币对取值都不会创建字典。
+    """
+
+    __slots__ = ("codes", "values", "timestamp", "base", "divisor", "source", "cross_rates")
+
+    def __init__(
+        self,
+        codes: CurrencyCodes,
+        values: array,
+        timestamp: int,
+        base: str = "USD",
+        divisor: float = 1.0,
+        source: str = "",
+        cross_rates: dict[str, tuple[Decimal | None, ...]] | None = None,
+    ):
+        self.codes: CurrencyCodes = codes
+        self.values: array = values  # 原始基准货币的汇率向量
+        self.timestamp: int = timestamp
+        self.base: str = base  # 当前视图的基准货币
+        self.divisor: float = divisor  # 原始基准下1单位base的汇率
+        self.source: str = source  # 提供数据的提供方名称
+        # 基准货币 -> 按货币索引排列的Decimal交叉汇率，同一快照的各视图共享
+        self.cross_rates: dict[str, tuple[Decimal | None, ...]] = (
+            {} if cross_rates is None else cross_rates
+        )
+
+    @classmethod
+    def from_response(
+        cls, codes: CurrencyCodes, data: dict[str, Any], source: str = ""
+    ) -> "RateSnapshot":
+        """由接口返回的原始快照构建"""
+        return cls(
+            codes,
+            codes.vectorize(data.get("rates", {})),
+            int(data.get("timestamp") or 0),
+            data.get("base", "USD"),
+            source=source,
+        )
+
+    def _raw(self, code: str) -> float | None:
+        """原始基准下的汇率，缺失时返回None"""
+        position = self.codes.positions.get(code)
+        if position is None or position >= len(self.values):
+            return None
+        value = self.values[position]
+        return None if math.isnan(value) else value
+
+    def rate(self, code: str) -> float | None:
+        """1单位基准货币可兑换的code数量，缺失时返回None"""
+        value = self._raw(code)
+        return None if value is None else value / self.divisor
+
+    def pair(self, base: str, quote: str) -> float | None:
+        """1单位base可兑换的quote数量，与快照当前的基准货币无关"""
+        base_rate = self._raw(base)
+        quote_rate = self._raw(quote)
+        if not base_rate or quote_rate is None:
+            return None
+        return quote_rate / base_rate
+
+    def rebase(self, base: str) -> "RateSnapshot | None":
+        """换算到另一种基准货币的视图，与原快照共享向量，基准货币缺失时返回None"""
+        if base == self.base:
+            return self
+        divisor = self._raw(base)
+        if not divisor:
+            return None
+        return RateSnapshot(
+            self.codes,
+            self.values,
+            self.timestamp,
+            base,
+            divisor,
+            self.source,
+            self.cross_rates,
+        )
+
+    def _cross_rates(self, base: str) -> tuple[Decimal | None, ...] | None:
+        """1单位base可兑换的各货币数量，每个快照每种基准货币只计算一次"""
+        rates = self.cross_rates.get(base)
+        if rates is None:
+            divisor = self._raw(base)
+            if not divisor:
+                return None
+            # 用最短十进制表示转换，避免把二进制浮点误差带入Decimal
+            decimal_divisor = Decimal(repr(divisor))
+            rates = self.cross_rates[base] = tuple(
+                None if math.isnan(value) else Decimal(repr(value)) / decimal_divisor
+                for value in self.values
+            )
+        return rates
+
+    def convert(
+        self, amounts: list[Decimal], base: str, targets: list[str]
+    ) -> dict[str, list[Decimal]]:
+        """把若干金额的base换算为各目标货币，结果按目标货币的最小单位四舍五入
+
+        Returns:
+            目标货币 -> 与amounts一一对应的换算结果，缺失汇率的货币不包含在内；
+            未找到base时返回空字典
+        """
+        rates = self._cross_rates(base)
+        if rates is None:
+            return {}
+        result = {}
+        for code in targets:
+            position = self.codes.positions.get(code)
+            rate = rates[position] if position is not None and position < len(rates) else None
+            if rate is not None:
+                result[code] = [round_amount(code, amount * rate) for amount in amounts]
+        return result
+
+    def __contains__(self, code: str) -> bool:
+        return self._raw(code) is not None
+
+    def rates(self, targets: list[str] | None = None) -> dict[str, float]:
+        """导出为 {货币代码: 汇率} 字典，默认包含全部货币"""
+        result = {}
+        for code in self.codes.codes if targets is None else targets:
+            value = self.rate(code)
+            if value is not None:
+                result[code] = value
+        return result
+
+    def to_response(self) -> dict[str, Any]:
+        """导出为与接口返回相同结构的原始快照"""
+        return {"timestamp": self.timestamp, "base": self.base, "rates": self.rates()}
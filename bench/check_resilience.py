@@ -0,0 +1,106 @@
+"""对冲请求与熔断的离线检查
+
+在本地模拟的OpenExchangeRates与er-api服务上检查:
+主接口响应慢时对冲到备用提供方、主接口连续失败后熔断并被跳过、
+主接口正常时不会消耗备用提供方半开状态的试探机会。需要在安装了AstrBot的环境中运行:
+
+    python bench/check_resilience.py
+"""
+
+import asyncio
+import importlib
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from mock_server import MockErApi, MockOpenExchangeRates  # noqa: E402
+
+# 以包的形式导入插件模块，使模块内的相对导入可用
+PLUGIN_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PLUGIN_DIR.parent))
+OpenExchangeRate = importlib.import_module(
+    f"{PLUGIN_DIR.name}.OpenExchangeRate"
+).OpenExchangeRate
+ErApiProvider = importlib.import_module(f"{PLUGIN_DIR.name}.Provider").ErApiProvider
+
+HEDGE_DELAY = 0.1
+
+
+async def check_hedge(client, primary: MockOpenExchangeRates, fallback: MockErApi):
+    """主接口超过对冲延迟未返回时，使用备用提供方的结果"""
+    primary.latency = HEDGE_DELAY * 5
+    started = time.perf_counter()
+    provider, _ = await client._fetch_from_providers(None)
+    elapsed = time.perf_counter() - started
+    assert provider.name == "er-api", provider.name
+    assert elapsed < primary.latency, f"对冲未生效，耗时{elapsed:.3f}s"
+    assert fallback.requests["latest"] == 1, fallback.requests
+    # 被对冲掉的主接口请求仍在后台完成，等待其结束以免影响后续检查
+    await asyncio.gather(*client._inflight.values(), return_exceptions=True)
+    primary.latency = 0.0
+
+
+async def check_breaker(client, primary: MockOpenExchangeRates, fallback: MockErApi):
+    """主接口连续失败达到阈值后熔断，之后的请求直接跳过主接口"""
+    breaker = client.breakers[client.name]
+    primary.error_rate = 1.0
+    try:
+        for _ in range(breaker.failure_threshold):
+            provider, _ = await client._fetch_from_providers(None)
+            assert provider.name == "er-api", provider.name
+        assert breaker.is_open, "主接口熔断器未打开"
+
+        before = primary.requests["latest"]
+        provider, _ = await client._fetch_from_providers(None)
+        assert provider.name == "er-api", provider.name
+        assert primary.requests["latest"] == before, "熔断期间仍请求了主接口"
+    finally:
+        primary.error_rate = 0.0
+        breaker.record_success()
+
+
+async def check_half_open(client, fallback: MockErApi):
+    """主接口正常返回时，备用提供方的半开试探机会保留到真正需要时"""
+    breaker = client.breakers["er-api"]
+    breaker.failures = breaker.failure_threshold
+    breaker.opened_at = time.monotonic() - breaker.reset_timeout
+    before = fallback.requests["latest"]
+    provider, _ = await client._fetch_from_providers(None)
+    assert provider is client, provider.name
+    assert fallback.requests["latest"] == before, "主接口正常时请求了备用提供方"
+    assert breaker.allow(), "备用提供方的半开试探被提前消耗"
+
+
+async def main():
+    primary = MockOpenExchangeRates(latency=0.0)
+    fallback = MockErApi(latency=0.0)
+    client = OpenExchangeRate(
+        "bench",
+        fallbacks=[ErApiProvider(base_url=await fallback.start())],
+        hedge_delay=HEDGE_DELAY,
+    )
+    client.base_url = await primary.start()
+    checks = [
+        ("对冲请求", check_hedge(client, primary, fallback)),
+        ("熔断跳过", check_breaker(client, primary, fallback)),
+        ("半开试探", check_half_open(client, fallback)),
+    ]
+    failed = 0
+    try:
+        for name, check in checks:
+            try:
+                await check
+                print(f"✅ {name}")
+            except AssertionError as e:
+                failed += 1
+                print(f"❌ {name}: {e}")
+    finally:
+        await client.close()
+        await primary.stop()
+        await fallback.stop()
+    return failed
+
+
+if __name__ == "__main__":
+    sys.exit(1 if asyncio.run(main()) else 0)
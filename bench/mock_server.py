@@ -0,0 +1,181 @@
+"""OpenExchangeRates API 的本地模拟服务，用于离线压测
+
+提供 latest.json、historical/*.json、currencies.json、usage.json，
+可配置响应延迟与错误率，并统计每个接口收到的请求数。
+MockErApi 模拟备用提供方er-api的 latest/USD 接口。
+"""
+
+import asyncio
+import json
+import random
+import time
+from collections import Counter
+from pathlib import Path
+
+from aiohttp import web
+
+# 与插件配置保持一致的货币代码列表
+CONF_SCHEMA = Path(__file__).resolve().parent.parent / "_conf_schema.json"
+
+
+def load_currency_codes() -> list[str]:
+    with open(CONF_SCHEMA, "r", encoding="utf-8") as f:
+        return json.load(f)["base_currency"]["options"]
+
+
+class MockOpenExchangeRates:
+    """模拟的OpenExchangeRates服务
+
+    Args:
+        latency: 每次响应前的等待秒数
+        jitter: 在latency基础上随机增加的最大秒数
+        error_rate: 返回503错误的概率(0~1)
+        seed: 随机种子，保证汇率数据可复现
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 42,
+    ):
+        self.latency: float = latency
+        self.jitter: float = jitter
+        self.error_rate: float = error_rate
+        self.codes: list[str] = load_currency_codes()
+        self.requests: Counter = Counter()
+        self._random = random.Random(seed)
+        self._base_rates = {
+            code: 1.0 if code == "USD" else round(self._random.uniform(0.1, 2000), 6)
+            for code in self.codes
+        }
+        self._runner: web.AppRunner | None = None
+        self.url: str = ""
+
+    def _rates_for(self, key: str) -> dict[str, float]:
+        """按日期生成稳定的汇率波动"""
+        rng = random.Random(key)
+        return {
+            code: rate if code == "USD" else rate * rng.uniform(0.97, 1.03)
+            for code, rate in self._base_rates.items()
+        }
+
+    async def _delay_or_fail(self, endpoint: str) -> web.Response | None:
+        self.requests[endpoint] += 1
+        await asyncio.sleep(self.latency + self._random.uniform(0, self.jitter))
+        if self._random.random() < self.error_rate:
+            return web.Response(status=503, text="mock upstream unavailable")
+        return None
+
+    async def latest(self, request: web.Request) -> web.Response:
+        error = await self._delay_or_fail("latest")
+        if error:
+            return error
+        now = int(time.time())
+        return web.json_response(
+            {"timestamp": now, "base": "USD", "rates": self._rates_for(str(now // 3600))}
+        )
+
+    async def historical(self, request: web.Request) -> web.Response:
+        error = await self._delay_or_fail("historical")
+        if error:
+            return error
+        date_str = request.match_info["date"]
+        timestamp = int(time.mktime(time.strptime(date_str, "%Y-%m-%d")))
+        return web.json_response(
+            {"timestamp": timestamp, "base": "USD", "rates": self._rates_for(date_str)}
+        )
+
+    async def currencies(self, request: web.Request) -> web.Response:
+        error = await self._delay_or_fail("currencies")
+        if error:
+            return error
+        return web.json_response({code: f"Currency {code}" for code in self.codes})
+
+    async def usage(self, request: web.Request) -> web.Response:
+        self.requests["usage"] += 1
+        total = sum(self.requests.values())
+        return web.json_response({
+            "status": 200,
+            "data": {
+                "app_id": request.query.get("app_id", ""),
+                "status": "active",
+                "plan": {"name": "Mock", "quota": "1000 requests / month", "update_frequency": "3600s"},
+                "usage": {
+                    "requests": total,
+                    "requests_quota": 1000000,
+                    "requests_remaining": 1000000 - total,
+                    "days_elapsed": 1,
+                    "days_remaining": 29,
+                    "daily_average": total,
+                },
+            },
+        })
+
+    PREFIX = "/api/"
+
+    def _add_routes(self, app: web.Application):
+        app.router.add_get("/api/latest.json", self.latest)
+        app.router.add_get("/api/historical/{date}.json", self.historical)
+        app.router.add_get("/api/currencies.json", self.currencies)
+        app.router.add_get("/api/usage.json", self.usage)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """启动服务，返回可作为插件 base_url 的地址"""
+        app = web.Application()
+        self._add_routes(app)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"http://{host}:{port}{self.PREFIX}"
+        return self.url
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+class MockErApi(MockOpenExchangeRates):
+    """模拟的ExchangeRate-API开放接口(er-api备用提供方)，只提供最新汇率"""
+
+    PREFIX = "/v6/"
+
+    def _add_routes(self, app: web.Application):
+        app.router.add_get("/v6/latest/USD", self.latest_usd)
+
+    async def latest_usd(self, request: web.Request) -> web.Response:
+        error = await self._delay_or_fail("latest")
+        if error:
+            return error
+        now = int(time.time())
+        return web.json_response({
+            "result": "success",
+            "time_last_update_unix": now - now % 86400,
+            "base_code": "USD",
+            "rates": self._rates_for(str(now // 86400)),
+        })
+
+
+async def _serve_forever(port: int, latency: float, error_rate: float):
+    server = MockOpenExchangeRates(latency=latency, error_rate=error_rate)
+    url = await server.start(port=port)
+    print(f"Mock OpenExchangeRates 服务已启动: {url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="本地模拟OpenExchangeRates API")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    asyncio.run(_serve_forever(args.port, args.latency, args.error_rate))
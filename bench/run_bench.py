@@ -0,0 +1,171 @@
+"""插件离线压测
+
+在本地模拟的OpenExchangeRates服务上，以指定并发驱动
+ExchangeRateQueryPlugin 的查询命令，报告吞吐、延迟分位数、
+每次查询的上游请求数与内存占用。需要在安装了AstrBot的环境中运行:
+
+    python bench/run_bench.py --queries 2000 --concurrency 50 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import importlib
+import math
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from mock_server import MockOpenExchangeRates  # noqa: E402
+
+# 以包的形式导入插件，使插件内的相对导入可用
+PLUGIN_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PLUGIN_DIR.parent))
+plugin_main = importlib.import_module(f"{PLUGIN_DIR.name}.main")
+HistoricalStore = importlib.import_module(
+    f"{PLUGIN_DIR.name}.HistoricalStore"
+).HistoricalStore
+CurrencyIndex = importlib.import_module(
+    f"{PLUGIN_DIR.name}.CurrencyIndex"
+).CurrencyIndex
+AlertBook = importlib.import_module(f"{PLUGIN_DIR.name}.RateAlert").AlertBook
+
+COMMON_CODES = ["USD", "CNY", "EUR", "JPY", "GBP", "HKD", "KRW", "RUB", "AUD", "CAD"]
+
+
+class BenchEvent:
+    """合成的消息事件，只实现插件命令用到的 AstrMessageEvent 接口"""
+
+    def __init__(self, message_str: str, index: int = 0):
+        self.message_str: str = message_str
+        self.unified_msg_origin: str = f"bench:GroupMessage:{index % 20}"
+
+    def get_sender_id(self) -> str:
+        return "bench"
+
+    def plain_result(self, text: str):
+        return ("plain", text)
+
+    def image_result(self, url: str):
+        return ("image", url)
+
+
+def make_queries(count: int, seed: int, batch_ratio: float) -> list[tuple[str, str]]:
+    """生成 (命令, 消息) 列表"""
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        if rng.random() < batch_ratio:
+            groups = [
+                " ".join(rng.sample(COMMON_CODES, 3)) for _ in range(rng.randint(2, 4))
+            ]
+            queries.append(("batch", "汇率批量 " + ", ".join(groups)))
+        else:
+            codes = rng.sample(COMMON_CODES, rng.randint(2, 5))
+            queries.append(("rate", "汇率 " + " ".join(codes)))
+    return queries
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(math.ceil(p / 100 * len(ordered)) - 1, 0)]
+
+
+async def run(args: argparse.Namespace):
+    server = MockOpenExchangeRates(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate
+    )
+    url = await server.start()
+
+    tracemalloc.start()
+    plugin = plugin_main.ExchangeRateQueryPlugin(
+        None,
+        {
+            "api_key": "bench",
+            "past_day": 7,
+            "enable_t2i": False,
+            "enable_prefetch": args.prefetch,
+            "fallback_providers": [],
+        },
+    )
+    plugin.client.base_url = url
+    # 使用临时目录存放历史汇率、货币列表、汇率提醒与快照状态，避免污染AstrBot数据目录
+    data_dir = tempfile.TemporaryDirectory(prefix="exchangerate-bench-")
+    plugin.client.historical_store = HistoricalStore(data_dir.name)
+    plugin.currency_index = CurrencyIndex(data_dir.name)
+    plugin.alerts = AlertBook(data_dir.name)
+    plugin.client.state_path = os.path.join(data_dir.name, "snapshots.bin")
+    if args.prefetch:
+        await asyncio.sleep(args.latency * 4 + 0.5)  # 等待首次预取完成
+
+    handlers = {
+        "rate": plugin.exchange_rate_query,
+        "batch": plugin.batch_exchange_rate_query,
+    }
+    queries = make_queries(args.queries, args.seed, args.batch_ratio)
+    upstream_before = sum(server.requests.values())
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: list[float] = []
+    failures = 0
+
+    async def one(index: int, command: str, message: str):
+        nonlocal failures
+        async with semaphore:
+            event = BenchEvent(message, index)
+            start = time.perf_counter()
+            results = [r async for r in handlers[command](event)]
+            latencies.append((time.perf_counter() - start) * 1000)
+            if any("失败" in text for _, text in results):
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i, c, m) for i, (c, m) in enumerate(queries)))
+    elapsed = time.perf_counter() - start
+
+    upstream = sum(server.requests.values()) - upstream_before
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    await plugin.terminate()
+    await server.stop()
+    data_dir.cleanup()
+
+    print("=" * 48)
+    print(f"查询数: {len(queries)}  并发: {args.concurrency}  上游延迟: {args.latency * 1000:.0f}ms")
+    print(f"吞吐: {len(queries) / elapsed:.1f} 次/秒  总耗时: {elapsed:.2f}s")
+    print(
+        "延迟(ms): "
+        f"p50 {percentile(latencies, 50):.2f}  "
+        f"p95 {percentile(latencies, 95):.2f}  "
+        f"p99 {percentile(latencies, 99):.2f}  "
+        f"max {max(latencies):.2f}"
+    )
+    print(f"失败回复: {failures}")
+    print(f"上游请求: {upstream} 次 ({upstream / len(queries):.4f} 次/查询)  {dict(server.requests)}")
+    print(f"内存: tracemalloc峰值 {peak / 1024 / 1024:.2f} MiB  最大RSS {max_rss:.1f} MiB")
+    print("=" * 48)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="汇率插件离线压测")
+    parser.add_argument("--queries", type=int, default=1000, help="查询总数")
+    parser.add_argument("--concurrency", type=int, default=20, help="并发数")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟上游延迟(秒)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="上游延迟随机抖动(秒)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="上游返回503的概率")
+    parser.add_argument("--batch-ratio", type=float, default=0.1, help="批量查询所占比例")
+    parser.add_argument("--prefetch", action="store_true", help="启用后台预取")
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,67 @@
-from astrbot.api.event import filter, AstrMessageEvent, MessageEventResult
+from astrbot.api.event import filter, AstrMessageEvent, MessageChain, MessageEventResult
 from astrbot.api.star import Context, Star, register
 from astrbot.core import AstrBotConfig
 from astrbot.api import logger
 
+from .CurrencyIndex import CurrencyIndex
+from .Metrics import Metrics, count_requests
 from .OpenExchangeRate import OpenExchangeRate
-from .src import EXCHANGE_RATE_TMPL
+from .Provider import PROVIDERS
+from .Prefetcher import RatePrefetcher
+from .QuotaBudget import QuotaBudget
+from .RateAlert import ABOVE, BELOW, MOVE, AlertBook
+from .RateSnapshot import RateSnapshot
+from .src import EXCHANGE_RATE_TMPL, EXCHANGE_RATE_BATCH_TMPL, EXCHANGE_RATE_TREND_TMPL
+
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal, InvalidOperation
+import functools
+import os
+import re
+import statistics
+from typing import Any, Awaitable, Callable, List
+
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+# 换算输入中的金额，可直接跟货币，如 "100"、"100USD"、"100美元"
+AMOUNT_TOKEN = re.compile(r"(\d+(?:\.\d+)?)([^\d.]*)")
+# 带千位分隔符的金额，如 "1,000"、"1,234,567.8"，需在按逗号分组前合并
+THOUSANDS_AMOUNT = re.compile(r"(?<![\d.])\d{1,3}(?:,\d{3})+(?!\d)")
+# 提醒条件: ">21.5"、"< 20" 或 "1%"
+ALERT_CONDITION = re.compile(r"([<>＜＞])\s*(\d+(?:\.\d+)?)|(\d+(?:\.\d+)?)\s*[%％]")
+
+
+def track_command(name: str):
+    """统计命令调用次数，以及该命令自身发起的上游请求数(不含并发命令与后台预取的请求)"""
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(self, event: AstrMessageEvent, *args, **kwargs):
+            self.metrics.incr("commands", command=name)
+            with count_requests() as tally:
+                try:
+                    async for result in handler(self, event, *args, **kwargs):
+                        yield result
+                finally:
+                    self.metrics.incr("command_upstream_requests", tally[0], command=name)
+
+        return wrapper
+
+    return decorator
+
+
+def timed(name: str):
+    """记录同步方法的耗时"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            with self.metrics.span(name):
+                return func(self, *args, **kwargs)
 
-from datetime import datetime, timedelta
-from typing import Any, List
+        return wrapper
+
+    return decorator
 
 
 @register(
@@ -18,6 +72,10 @@ from typing import Any, List
     "https://github.com/MoonShadow1976/astrbot_plugin_ExchangeRateQuery",
 )
 class ExchangeRateQueryPlugin(Star):
+    RENDER_CACHE_SIZE = 64  # 渲染结果缓存条目数
+    MAX_CONVERSIONS = 100  # 单条换算消息最多输出的结果数
+    MAX_AMOUNT = Decimal(10) ** 12  # 换算金额上限，避免结果超出Decimal默认的28位精度
+
     def __init__(self, context: Context, config: AstrBotConfig):
         super().__init__(context)
         self.api_key: str = config.get("api_key", "")
@@ -27,11 +85,57 @@ class ExchangeRateQueryPlugin(Star):
             "target_currencies", ["USD", "RUB", "EUR", "JPY"]
         )
         self.enable_t2i: bool = config.get("enable_t2i", False)
+        self.enable_prefetch: bool = config.get("enable_prefetch", True)
+        self.trend_max_days: int = config.get("trend_max_days", 60)
 
         if not self.api_key:
             logger.error("未配置OpenExchangeRates API KEY!")
 
-        self.client = OpenExchangeRate(self.api_key)
+        self.data_dir: str = os.path.join(
+            "data", "plugin_data", "astrbot_plugin_ExchangeRateQuery"
+        )
+        http_options = {
+            "timeout": config.get("http_timeout", 10.0),
+            "pool_size": config.get("http_pool_size", 10),
+            "compression": config.get("http_compression", True),
+        }
+        # 备用提供方: 主接口慢或失败时对冲请求
+        fallbacks = []
+        for name in config.get("fallback_providers", []):
+            provider_cls = PROVIDERS.get(name)
+            if provider_cls is None:
+                logger.warning(f"未知的备用汇率提供方: {name}")
+                continue
+            fallbacks.append(provider_cls(**http_options))
+
+        self.metrics = Metrics()
+        self.client = OpenExchangeRate(
+            self.api_key,
+            data_dir=self.data_dir,
+            fallbacks=fallbacks,
+            hedge_delay=config.get("hedge_delay", 1.5),
+            stale_max_age=config.get("stale_max_age", 24) * 3600,
+            metrics=self.metrics,
+            **http_options,
+        )
+
+        # 货币名称与别名索引，首次使用时从本地文件加载
+        self.currency_index = CurrencyIndex(self.data_dir)
+
+        # 汇率提醒: 每次获取到新的最新汇率时批量检查并推送
+        self.alerts = AlertBook(self.data_dir)
+        self.client.snapshot_listeners.append(self._on_latest_snapshot)
+
+        # 渲染结果缓存: (查询参数, 快照时间戳) -> 图片url
+        self._render_cache: OrderedDict[tuple, str] = OrderedDict()
+
+        # 按剩余额度调整缓存有效期，后台预取最新与历史汇率
+        self.budget = QuotaBudget(self.client)
+        self.prefetcher = RatePrefetcher(self.client, self.budget, self.past_day)
+        if self.api_key:
+            self.budget.start()
+            if self.enable_prefetch:
+                self.prefetcher.start()
 
 
     @filter.command("汇率帮助", alias={"汇率查询"})
@@ -45,26 +149,41 @@ class ExchangeRateQueryPlugin(Star):
             "/汇率usage :查询key的健康值\n",
             "/汇率 :查询默认配置的汇率\n",
             "/汇率 USD JPY EUR :查询美元对日元和欧元的汇率\n",
+            "/汇率 美元 日元 :也可使用中英文名称或别名\n",
+            "/汇率批量 USD JPY, EUR CNY :一次查询多组基准货币的汇率\n",
+            "/汇率换算 100 USD JPY EUR :把100美元换算为日元和欧元\n",
+            "/汇率趋势 USD JPY 30 :查询美元对日元近30天的走势\n",
+            "/汇率订阅 CNY JPY >21.5 1% :汇率高于21.5或单日涨跌超过1%时提醒\n",
+            "/汇率订阅列表 :查看本会话的汇率提醒\n",
+            "/汇率退订 1 :取消编号为1的提醒，/汇率退订 全部 取消全部\n",
+            "/汇率metrics [prom] :查看插件性能指标(管理员)\n",
         ]
         if self.enable_t2i:
-            url = await self.text_to_image("\n".join(report))
+            # 帮助内容固定，只渲染一次
+            url = await self._render_cached(
+                ("help",), lambda: self.text_to_image("\n".join(report))
+            )
             yield event.image_result(url)
         else:
             yield event.plain_result("\n".join(report))
 
 
     @filter.command("汇率代码", alias={"货币代码"})
+    @track_command("汇率代码")
     async def currencies_query(self, event: AstrMessageEvent):
         """获取支持的货币代码与名称"""
-        currencies = await self.client.fetch_currencies()
-
-        # 格式化货币代码输出
-        formatted_currencies = "🏦【支持的货币代码】\n\n"
-        for code, name in sorted(currencies.items()):
-            formatted_currencies += f"• {code}: {name}\n\n"
+        index = await self._currency_index()
+        if not index.loaded:
+            yield event.plain_result("获取货币列表失败，请稍后再试")
+            return
+        formatted_currencies = index.formatted_list()
 
         if self.enable_t2i:
-            url = await self.text_to_image(formatted_currencies)
+            # 货币列表不变时复用已渲染的图片
+            url = await self._render_cached(
+                ("currencies", formatted_currencies),
+                lambda: self.text_to_image(formatted_currencies),
+            )
             yield event.image_result(url)
         else:
             yield event.plain_result(formatted_currencies)
@@ -81,6 +200,7 @@ class ExchangeRateQueryPlugin(Star):
             # 获取API使用信息
             usage_info = await self.client.check_usage_info()
             logger.debug(f"查询usage: {usage_info}")
+            self.budget.update(usage_info)
 
             # 安全获取数据字段
             data = usage_info.get("data", {})
@@ -114,6 +234,7 @@ class ExchangeRateQueryPlugin(Star):
             report.append(
                 f"\n{health_icon} 健康状态: {remaining_percent:.1f}% 剩余额度"
             )
+            report.append(f"\n⏱️ 额度调度: {self.budget.last_decision}")
 
             if self.enable_t2i:
                 url = await self.text_to_image("\n".join(report))
@@ -126,7 +247,20 @@ class ExchangeRateQueryPlugin(Star):
             yield event.plain_result("获取健康值失败，请检查服务器日志")
 
 
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("汇率metrics", alias={"汇率指标"})
+    async def metrics_query(self, event: AstrMessageEvent):
+        """查看耗时分位数、缓存命中与上游请求统计(管理员)"""
+        parts = event.message_str.strip().split()
+        if len(parts) > 1 and parts[1].lower() in ("prom", "prometheus"):
+            yield event.plain_result(self.metrics.prometheus())
+            return
+        report = ["📊【汇率插件指标】", "", *self.metrics.summary()]
+        yield event.plain_result("\n".join(report))
+
+
     @filter.command("汇率", alias={"汇率查询"})
+    @track_command("汇率")
     async def exchange_rate_query(self, event: AstrMessageEvent):
         """查询货币汇率"""
         if not self.api_key:
@@ -139,36 +273,51 @@ class ExchangeRateQueryPlugin(Star):
         target_currencies = self.default_currencies
         logger.info(f"查询汇率: 用户输入：{parts}")
 
-        if len(parts) > 1:
-            base_currency = parts[1].upper()
-            target_currencies = [
-                c.upper() for c in parts[2:]
-            ] or self.default_currencies
-
         try:
             # 获取支持的货币代码与名称
-            currencies = await self.client.fetch_currencies()
+            index = await self._currency_index()
+            currencies = index.names
+            if len(parts) > 1:
+                base_currency = self._resolve_currency(parts[1])
+                target_currencies = [
+                    self._resolve_currency(c) for c in parts[2:]
+                ] or self.default_currencies
 
             # 获取当前和一周前汇率
             current_date = datetime.now()
             week_ago = current_date - timedelta(days=self.past_day)
+            past_date = week_ago.strftime("%Y-%m-%d")
 
-            current_rates = await self.client.fetch_latest_rates(base_currency)
-            historical_rates = await self.client.fetch_historical_rates(
-                week_ago.strftime("%Y-%m-%d"), base_currency
+            current_rates = await self.client.fetch_latest_snapshot(base_currency)
+            historical_rates = await self.client.fetch_historical_snapshot(
+                past_date, base_currency
             )
 
             if self.enable_t2i:
-                # 使用自定义HTML模板渲染图片
-                html_data = self._format_html_comparison(
-                    currencies,
+                # 使用自定义HTML模板渲染图片，同一数据窗口内的相同查询复用结果
+                render_key = (
+                    "rate",
                     base_currency,
-                    current_rates,
-                    historical_rates,
-                    target_currencies,
+                    tuple(target_currencies),
+                    self.past_day,
+                    self.client.latest_timestamp(),
+                    self.client.historical_timestamp(past_date),
+                    self.client.is_latest_stale(),
                 )
                 try:
-                    url = await self.html_render(EXCHANGE_RATE_TMPL, html_data)
+                    url = await self._render_cached(
+                        render_key,
+                        lambda: self.html_render(
+                            EXCHANGE_RATE_TMPL,
+                            self._format_html_comparison(
+                                currencies,
+                                base_currency,
+                                current_rates,
+                                historical_rates,
+                                target_currencies,
+                            ),
+                        ),
+                    )
                     yield event.image_result(url)
                 except Exception as e:
                     logger.error(f"HTML渲染失败: {str(e)}")
@@ -180,7 +329,7 @@ class ExchangeRateQueryPlugin(Star):
                         historical_rates,
                         target_currencies,
                     )
-                    yield event.plain_result(text_result)
+                    yield event.plain_result(self._with_stale_note(text_result))
             else:
                 # 生成对比结果
                 text_result = self._format_text_comparison(
@@ -190,19 +339,549 @@ class ExchangeRateQueryPlugin(Star):
                     historical_rates,
                     target_currencies,
                 )
-                yield event.plain_result(text_result)
+                yield event.plain_result(self._with_stale_note(text_result))
 
         except Exception as e:
             logger.error(f"汇率查询失败: {str(e)}")
             yield event.plain_result("汇率查询失败，请稍后再试")
 
 
+    @filter.command("汇率批量", alias={"批量汇率"})
+    @track_command("汇率批量")
+    async def batch_exchange_rate_query(self, event: AstrMessageEvent):
+        """批量查询多组货币汇率"""
+        if not self.api_key:
+            yield event.plain_result("控制台未配置API密钥")
+            return
+
+        currencies = (await self._currency_index()).names
+        groups = self._parse_batch_groups(event.message_str)
+        logger.info(f"批量查询汇率: {groups}")
+        if not groups:
+            yield event.plain_result("请按格式输入，如: /汇率批量 USD JPY, EUR CNY, GBP HKD")
+            return
+
+        try:
+            results = await self.query_pairs(groups)
+
+            if self.enable_t2i:
+                past_date = (datetime.now() - timedelta(days=self.past_day)).strftime(
+                    "%Y-%m-%d"
+                )
+                render_key = (
+                    "batch",
+                    tuple((base, tuple(targets)) for base, targets in groups),
+                    self.past_day,
+                    self.client.latest_timestamp(),
+                    self.client.historical_timestamp(past_date),
+                    self.client.is_latest_stale(),
+                )
+                try:
+                    url = await self._render_cached(
+                        render_key,
+                        lambda: self.html_render(
+                            EXCHANGE_RATE_BATCH_TMPL,
+                            {
+                                "past_days": self.past_day,
+                                "groups": [
+                                    self._format_html_comparison(currencies, *result)
+                                    for result in results
+                                ],
+                                "update_time": datetime.now().strftime(
+                                    "%Y-%m-%d %H:%M"
+                                ),
+                                "stale_note": self._stale_note(),
+                            },
+                        ),
+                    )
+                    yield event.image_result(url)
+                    return
+                except Exception as e:
+                    logger.error(f"HTML渲染失败: {str(e)}")
+
+            text_result = "\n\n".join(
+                self._format_text_comparison(currencies, *result) for result in results
+            )
+            yield event.plain_result(self._with_stale_note(text_result))
+
+        except Exception as e:
+            logger.error(f"批量汇率查询失败: {str(e)}")
+            yield event.plain_result("汇率查询失败，请稍后再试")
+
+
+    def _parse_batch_groups(self, message: str) -> list[tuple[str, list[str]]]:
+        """解析批量查询输入，每组为 基准货币 目标货币...，组间用逗号、分号或换行分隔"""
+        parts = message.strip().split(maxsplit=1)
+        if len(parts) < 2:
+            return []
+
+        groups = []
+        for chunk in re.split(r"[,，;；\n]+", parts[1]):
+            codes = [self._resolve_currency(c) for c in chunk.split()]
+            if codes:
+                groups.append((codes[0], codes[1:] or self.default_currencies))
+        return groups
+
+
+    @filter.command("汇率换算", alias={"货币换算"})
+    @track_command("汇率换算")
+    async def convert_query(self, event: AstrMessageEvent):
+        """按最新汇率换算金额"""
+        if not self.api_key:
+            yield event.plain_result("控制台未配置API密钥")
+            return
+
+        await self._currency_index()
+        try:
+            groups = self._parse_convert_groups(event.message_str)
+        except ValueError as e:
+            yield event.plain_result(f"{e}\n请按格式输入，如: /汇率换算 100 USD JPY EUR")
+            return
+        logger.info(f"换算金额: {groups}")
+        if not groups:
+            yield event.plain_result(
+                "请按格式输入，如: /汇率换算 100 USD JPY EUR\n"
+                "可输入多个金额或多组，如: /汇率换算 100 250 USD JPY, 50 EUR CNY"
+            )
+            return
+        if sum(len(a) * len(t) for a, _, t in groups) > self.MAX_CONVERSIONS:
+            yield event.plain_result(f"单次最多换算{self.MAX_CONVERSIONS}个结果，请减少金额或目标货币")
+            return
+
+        try:
+            report = ["💱【汇率换算】"]
+            for amounts, base_currency, target_currencies in groups:
+                converted = await self.client.convert(
+                    amounts, base_currency, target_currencies
+                )
+                for i, amount in enumerate(amounts):
+                    report.append("")
+                    report.append(f"{amount:,} {base_currency} =")
+                    report.extend(
+                        f"   • {values[i]:,} {currency}"
+                        for currency, values in converted.items()
+                    )
+                    if not converted:
+                        report.append("   ❌ 未找到有效的汇率数据")
+            text_result = self._with_stale_note("\n".join(report))
+
+            if self.enable_t2i:
+                url = await self._render_cached(
+                    ("convert", text_result), lambda: self.text_to_image(text_result)
+                )
+                yield event.image_result(url)
+            else:
+                yield event.plain_result(text_result)
+
+        except InvalidOperation:
+            # 金额在上限内但汇率极端时，结果仍可能超出精度
+            yield event.plain_result("换算结果超出可表示的范围，请减小金额")
+        except Exception as e:
+            logger.error(f"汇率换算失败: {str(e)}")
+            yield event.plain_result("汇率换算失败，请稍后再试")
+
+
+    def _parse_convert_groups(
+        self, message: str
+    ) -> list[tuple[list[Decimal], str, list[str]]]:
+        """解析换算输入，每组为 金额... 源货币 目标货币...，组间用逗号、分号或换行分隔
+
+        金额可带千位分隔符(如1,000)。未给出源货币时使用默认基准货币，
+        未给出目标货币时使用默认目标货币。
+
+        Raises:
+            ValueError: 金额格式不正确、不大于0或过大，或某组缺少金额
+        """
+        parts = message.strip().split(maxsplit=1)
+        if len(parts) < 2:
+            return []
+
+        text = THOUSANDS_AMOUNT.sub(lambda m: m.group(0).replace(",", ""), parts[1])
+        groups = []
+        for chunk in re.split(r"[,，;；\n]+", text):
+            amounts, codes = [], []
+            for token in chunk.split():
+                match = AMOUNT_TOKEN.fullmatch(token)
+                if match:
+                    amount = Decimal(match.group(1))
+                    if amount <= 0:
+                        raise ValueError(f"金额必须大于0: {token}")
+                    if amount >= self.MAX_AMOUNT:
+                        raise ValueError(f"金额过大，需小于{self.MAX_AMOUNT:,}: {token}")
+                    amounts.append(amount)
+                    token = match.group(2)
+                elif token[0] in "0123456789+-.":
+                    raise ValueError(f"无效的金额: {token}")
+                if token:
+                    codes.append(self._resolve_currency(token))
+            if codes and not amounts:
+                raise ValueError(f"缺少金额: {chunk.strip()}")
+            if amounts:
+                base_currency = codes[0] if codes else self.base_currency
+                groups.append((amounts, base_currency, codes[1:] or self.default_currencies))
+        return groups
+
+
+    async def _currency_index(self) -> CurrencyIndex:
+        """返回已加载的货币索引，本地缺失或过期时才请求货币列表"""
+        await self.currency_index.ensure(self.client.fetch_currencies)
+        return self.currency_index
+
+
+    def _resolve_currency(self, text: str) -> str:
+        """把代码、中英文名称或别名解析为货币代码，无法识别时按原样大写"""
+        return self.currency_index.resolve(text) or text.upper()
+
+
+    async def query_pairs(
+        self, groups: list[tuple[str, list[str]]]
+    ) -> list[tuple[str, RateSnapshot | None, RateSnapshot | None, list[str]]]:
+        """基于同一份最新与历史快照计算多组基准货币的汇率
+
+        每份快照只在第一组时请求一次，其余各组直接从缓存换算。
+
+        Returns:
+            每组的 (基准货币, 当前汇率快照, 历史汇率快照, 目标货币)，
+            未找到基准货币时快照为None
+        """
+        past_date = (datetime.now() - timedelta(days=self.past_day)).strftime(
+            "%Y-%m-%d"
+        )
+        results = []
+        for base_currency, target_currencies in groups:
+            current_rates = await self.client.fetch_latest_snapshot(base_currency)
+            historical_rates = await self.client.fetch_historical_snapshot(
+                past_date, base_currency
+            )
+            results.append(
+                (base_currency, current_rates, historical_rates, target_currencies)
+            )
+        return results
+
+
+    @filter.command("汇率趋势", alias={"汇率走势"})
+    @track_command("汇率趋势")
+    async def trend_query(self, event: AstrMessageEvent):
+        """查询一段时间内的汇率走势"""
+        if not self.api_key:
+            yield event.plain_result("控制台未配置API密钥")
+            return
+
+        # 解析用户输入: [基准货币] [目标货币...] [天数]
+        currencies = (await self._currency_index()).names
+        days = 30
+        codes = []
+        for part in event.message_str.strip().split()[1:]:
+            if part.isdigit():
+                days = int(part)
+            else:
+                codes.append(self._resolve_currency(part))
+        days = max(2, min(days, self.trend_max_days))
+        base_currency = codes[0] if codes else self.base_currency
+        target_currencies = codes[1:] or self.default_currencies
+        logger.info(f"查询汇率走势: {base_currency} {target_currencies} {days}天")
+
+        today = datetime.now()
+        dates = [
+            (today - timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days, 0, -1)
+        ]
+        missing = self.client.missing_historical_dates(dates)
+        if missing:
+            # 回填按额度预算限制，额度未知时不回填
+            if self.budget.is_due():
+                await self.budget.refresh()
+            allowance = self.budget.backfill_allowance()
+            if allowance is None:
+                yield event.plain_result(
+                    f"需要回填{len(missing)}天历史汇率，但暂时无法获取API额度信息，请稍后再试"
+                )
+                return
+            if len(missing) > allowance:
+                yield event.plain_result(
+                    f"需要回填{len(missing)}天历史汇率，超出当前可用于回填的额度"
+                    f"({int(allowance)}次)，请缩短天数后再试"
+                )
+                return
+            self.budget.spend(len(missing))
+            logger.info(f"回填{len(missing)}天历史汇率")
+
+        try:
+            series = await self.client.fetch_historical_series(
+                dates, base_currency, target_currencies
+            )
+            current_rates = await self.client.fetch_latest_snapshot(base_currency)
+
+            trends = []
+            for currency in target_currencies:
+                values = [
+                    snapshot.rate(currency)
+                    for snapshot in series.values()
+                    if currency in snapshot
+                ]
+                if current_rates and currency in current_rates:
+                    values.append(current_rates.rate(currency))
+                if len(values) >= 2:
+                    trends.append((currency, values))
+
+            if self.enable_t2i:
+                html_data = self._format_html_trend(
+                    currencies, base_currency, trends, dates[0], days
+                )
+                # 同一组日期与最新快照的走势图只渲染一次
+                render_key = (
+                    "trend",
+                    base_currency,
+                    tuple(target_currencies),
+                    tuple(series),
+                    self.client.latest_timestamp(),
+                )
+                try:
+                    url = await self._render_cached(
+                        render_key,
+                        lambda: self.html_render(EXCHANGE_RATE_TREND_TMPL, html_data),
+                    )
+                    yield event.image_result(url)
+                    return
+                except Exception as e:
+                    logger.error(f"HTML渲染失败: {str(e)}")
+
+            yield event.plain_result(
+                self._format_text_trend(currencies, base_currency, trends, days)
+            )
+
+        except Exception as e:
+            logger.error(f"汇率走势查询失败: {str(e)}")
+            yield event.plain_result("汇率走势查询失败，请稍后再试")
+
+
+    @filter.command("汇率订阅", alias={"汇率提醒"})
+    async def alert_subscribe(self, event: AstrMessageEvent):
+        """订阅汇率提醒: 汇率穿过阈值或单日涨跌超过百分比时推送到当前会话"""
+        if not self.api_key:
+            yield event.plain_result("控制台未配置API密钥")
+            return
+
+        parts = event.message_str.strip().split(maxsplit=3)
+        conditions = ALERT_CONDITION.findall(parts[3]) if len(parts) > 3 else []
+        if not conditions:
+            yield event.plain_result(
+                "请按格式输入，如: /汇率订阅 CNY JPY >21.5 1%\n"
+                "支持 >阈值、<阈值 与 涨跌幅百分比，可同时设置多个条件"
+            )
+            return
+
+        await self._currency_index()
+        base_currency = self._resolve_currency(parts[1])
+        quote_currency = self._resolve_currency(parts[2])
+        try:
+            snapshot = await self.client.fetch_latest_snapshot()
+        except Exception as e:
+            logger.error(f"汇率订阅失败: {str(e)}")
+            yield event.plain_result("获取汇率失败，请稍后再试")
+            return
+        rate = snapshot.pair(base_currency, quote_currency) if snapshot else None
+        if rate is None:
+            yield event.plain_result(f"未找到 {base_currency}→{quote_currency} 的汇率")
+            return
+
+        report = [f"✅ 已订阅，当前 1 {base_currency} = {rate:.4f} {quote_currency}"]
+        for op, threshold, percent in conditions:
+            if percent:
+                kind, value = MOVE, float(percent)
+            else:
+                kind, value = (ABOVE if op in ">＞" else BELOW), float(threshold)
+            try:
+                rule = self.alerts.add(
+                    event.unified_msg_origin,
+                    base_currency,
+                    quote_currency,
+                    kind,
+                    value,
+                    rate,
+                )
+            except ValueError as e:
+                report.append(f"❌ {e}")
+                break
+            line = f"• #{rule.id} {rule.describe()}"
+            if (kind == ABOVE and rate > value) or (kind == BELOW and rate < value):
+                # 阈值规则只在汇率穿过阈值时触发，已满足的条件不会立即提醒
+                line += " (当前已满足，汇率回到阈值另一侧后再次穿过时才会提醒)"
+            report.append(line)
+        if not self.enable_prefetch:
+            report.append("⚠️ 未启用后台预取，提醒只会在有人查询汇率时检查")
+        yield event.plain_result("\n".join(report))
+
+
+    @filter.command("汇率订阅列表", alias={"汇率提醒列表"})
+    async def alert_list(self, event: AstrMessageEvent):
+        """查看当前会话的汇率提醒"""
+        rules = self.alerts.session_rules(event.unified_msg_origin)
+        if not rules:
+            yield event.plain_result("当前会话没有汇率提醒")
+            return
+        report = ["🔔【汇率提醒列表】"]
+        report.extend(f"• #{rule.id} {rule.describe()}" for rule in rules)
+        yield event.plain_result("\n".join(report))
+
+
+    @filter.command("汇率退订", alias={"取消汇率提醒"})
+    async def alert_unsubscribe(self, event: AstrMessageEvent):
+        """取消当前会话的汇率提醒"""
+        parts = event.message_str.strip().split()
+        if len(parts) < 2:
+            yield event.plain_result("请输入提醒编号，如: /汇率退订 1，或 /汇率退订 全部")
+            return
+        if parts[1] in ("全部", "all"):
+            removed = self.alerts.remove(event.unified_msg_origin)
+        elif parts[1].lstrip("#").isdigit():
+            removed = self.alerts.remove(event.unified_msg_origin, int(parts[1].lstrip("#")))
+        else:
+            removed = 0
+        if removed:
+            yield event.plain_result(f"已取消{removed}条汇率提醒")
+        else:
+            yield event.plain_result("未找到对应的汇率提醒")
+
+
+    async def _on_latest_snapshot(self, snapshot: RateSnapshot):
+        """获取到新的最新汇率时批量检查提醒规则，并按会话合并推送"""
+        if not self.alerts:
+            return
+        reference = None
+        if self.alerts.has_move_rules():
+            # 涨跌幅相对前一日(UTC)的汇率计算
+            yesterday = datetime.fromtimestamp(snapshot.timestamp, timezone.utc) - timedelta(days=1)
+            try:
+                reference = await self.client.fetch_historical_snapshot(
+                    yesterday.strftime("%Y-%m-%d")
+                )
+            except Exception as e:
+                logger.warning(f"获取前一日汇率失败，跳过涨跌幅提醒: {str(e)}")
+
+        with self.metrics.span("alert_evaluate"):
+            messages = self.alerts.evaluate(snapshot, reference)
+        for origin, lines in messages.items():
+            self.metrics.incr("alerts_sent", value=len(lines))
+            try:
+                await self.context.send_message(
+                    origin, MessageChain().message("\n".join(["📢【汇率提醒】", *lines]))
+                )
+            except Exception as e:
+                logger.warning(f"推送汇率提醒失败({origin}): {str(e)}")
+
+
+    @staticmethod
+    def _summarize_trend(values: list[float]) -> dict[str, float]:
+        """计算区间最低、最高、均值、区间涨跌幅与日波动率(日收益率标准差，%)"""
+        returns = [(b - a) / a for a, b in zip(values, values[1:]) if a]
+        return {
+            "min": min(values),
+            "max": max(values),
+            "mean": statistics.fmean(values),
+            "change_percent": (values[-1] - values[0]) / values[0] * 100,
+            "volatility": statistics.pstdev(returns) * 100 if len(returns) > 1 else 0.0,
+        }
+
+
+    @staticmethod
+    def _sparkline(values: list[float], width: int = 30) -> str:
+        """生成文本sparkline，点数过多时等距抽样"""
+        if len(values) > width:
+            step = (len(values) - 1) / (width - 1)
+            values = [values[round(i * step)] for i in range(width)]
+        low, high = min(values), max(values)
+        span = (high - low) or 1.0
+        top = len(SPARK_CHARS) - 1
+        return "".join(SPARK_CHARS[round((v - low) / span * top)] for v in values)
+
+
+    def _format_text_trend(
+        self,
+        currencies: dict[str, str],
+        base: str,
+        trends: list[tuple[str, list[float]]],
+        days: int,
+    ) -> str:
+        """格式化汇率走势为文本形式"""
+        base_currency_name = currencies.get(base, base)
+        result = [f"📈 【{base}({base_currency_name}) 汇率走势报告】"]
+        result.append(f"📊 统计区间: 近{days}天")
+        result.append("")
+
+        for currency, values in trends:
+            stats = self._summarize_trend(values)
+            currency_name = currencies.get(currency, currency)
+            result.append(f"💰 {currency}({currency_name}):")
+            result.append(f"   {self._sparkline(values)}")
+            result.append(f"   • 最低/最高: {stats['min']:.4f} / {stats['max']:.4f}")
+            result.append(f"   • 均值: {stats['mean']:.4f}")
+            result.append(f"   • 区间涨跌: {stats['change_percent']:+.2f}%")
+            result.append(f"   • 日波动率: {stats['volatility']:.2f}%")
+            result.append("")
+
+        if len(result) == 3:  # 只有标题和时间范围，没有有效数据
+            result.append("❌ 未找到有效的汇率数据")
+
+        return "\n".join(result)
+
+
+    def _format_html_trend(
+        self,
+        currencies: dict[str, str],
+        base: str,
+        trends: list[tuple[str, list[float]]],
+        start_date: str,
+        days: int,
+        chart_width: int = 600,
+        chart_height: int = 120,
+        padding: int = 10,
+    ) -> dict[str, str | int | list[Any]]:
+        """准备走势HTML模板渲染所需的数据，含sparkline折线坐标"""
+        items = []
+        for currency, values in trends:
+            stats = self._summarize_trend(values)
+            low, high = stats["min"], stats["max"]
+            span = (high - low) or 1.0
+            x_step = (chart_width - 2 * padding) / (len(values) - 1)
+            points = " ".join(
+                f"{padding + i * x_step:.1f},"
+                f"{chart_height - padding - (v - low) / span * (chart_height - 2 * padding):.1f}"
+                for i, v in enumerate(values)
+            )
+            change = stats["change_percent"]
+            items.append({
+                "currency_code": currency,
+                "currency_name": currencies.get(currency, currency),
+                "points": points,
+                "min": f"{low:.4f}",
+                "max": f"{high:.4f}",
+                "mean": f"{stats['mean']:.4f}",
+                "volatility": f"{stats['volatility']:.2f}%",
+                "change_percent": f"{change:+.2f}%",
+                "trend": "up" if change > 0 else ("down" if change < 0 else "same"),
+                "arrow": "↑" if change > 0 else ("↓" if change < 0 else "→"),
+            })
+
+        return {
+            "base_currency": base,
+            "base_currency_name": currencies.get(base, base),
+            "days": days,
+            "start_date": start_date,
+            "end_date": datetime.now().strftime("%Y-%m-%d"),
+            "trends": items,
+            "chart_width": chart_width,
+            "chart_height": chart_height,
+            "update_time": datetime.now().strftime("%Y-%m-%d %H:%M"),
+        }
+
+
+    @timed("format_text_comparison")
     def _format_text_comparison(
         self,
         currencies: dict[str, str],
         base: str,
-        current: dict[str, float],
-        historical: dict[str, float],
+        current: RateSnapshot | None,
+        historical: RateSnapshot | None,
         targets: list[str],
     ) -> str:
         """格式化汇率对比结果为文本形式"""
@@ -212,8 +891,8 @@ class ExchangeRateQueryPlugin(Star):
         result.append("")
         
         for currency in targets:
-            curr_rate = current.get(currency)
-            hist_rate = historical.get(currency)
+            curr_rate = current.rate(currency) if current else None
+            hist_rate = historical.rate(currency) if historical else None
 
             if curr_rate and hist_rate:
                 change = curr_rate - hist_rate
@@ -235,12 +914,13 @@ class ExchangeRateQueryPlugin(Star):
         return "\n".join(result)
 
 
+    @timed("format_html_comparison")
     def _format_html_comparison(
         self,
         currencies: dict[str, str],
         base: str,
-        current: dict[str, float],
-        historical: dict[str, float],
+        current: RateSnapshot | None,
+        historical: RateSnapshot | None,
         targets: list[str],
     ) -> dict[str, str | int | list[Any]]:
         """准备HTML模板渲染所需的数据"""
@@ -248,8 +928,8 @@ class ExchangeRateQueryPlugin(Star):
         comparisons = []
         
         for currency in targets:
-            curr_rate = current.get(currency)
-            hist_rate = historical.get(currency)
+            curr_rate = current.rate(currency) if current else None
+            hist_rate = historical.rate(currency) if historical else None
 
             if curr_rate and hist_rate:
                 change = curr_rate - hist_rate
@@ -275,10 +955,65 @@ class ExchangeRateQueryPlugin(Star):
             "base_currency_name": base_currency_name,
             "past_days": self.past_day,
             "comparisons": comparisons,
-            "update_time": datetime.now().strftime("%Y-%m-%d %H:%M")
+            "update_time": datetime.now().strftime("%Y-%m-%d %H:%M"),
+            "stale_note": self._stale_note(),
         }
 
 
+    def _stale_note(self) -> str:
+        """最新汇率已过期、正在使用旧数据时返回提示，否则为空"""
+        if not self.client.is_latest_stale():
+            return ""
+        timestamp = self.client.latest_timestamp()
+        updated = (
+            datetime.fromtimestamp(timestamp).strftime("%m-%d %H:%M")
+            if timestamp
+            else "未知"
+        )
+        return f"⚠️ 当前为 {updated} 的汇率数据，最新数据正在获取中"
+
+
+    def _with_stale_note(self, text: str) -> str:
+        """在文本结果末尾附加旧数据提示"""
+        note = self._stale_note()
+        return f"{text}\n{note}" if note else text
+
+
+    async def _render_cached(
+        self, key: tuple, render: Callable[[], Awaitable[str]]
+    ) -> str:
+        """按key缓存渲染得到的图片url，命中时跳过渲染
+
+        key中包含None(如快照时间戳未知)时不缓存。
+        """
+        url = self._render_cache.get(key)
+        if url is not None and self._is_render_available(url):
+            self.metrics.incr("render_cache", result="hit")
+            self._render_cache.move_to_end(key)
+            return url
+
+        self.metrics.incr("render_cache", result="miss")
+        with self.metrics.span("render"):
+            url = await render()
+        if None not in key:
+            self._render_cache[key] = url
+            self._render_cache.move_to_end(key)
+            while len(self._render_cache) > self.RENDER_CACHE_SIZE:
+                self._render_cache.popitem(last=False)
+        return url
+
+
+    @staticmethod
+    def _is_render_available(url: str) -> bool:
+        """本地渲染文件可能被清理，确认仍存在后再复用"""
+        if url.startswith(("http://", "https://")):
+            return True
+        path = url[len("file://"):] if url.startswith("file://") else url
+        return os.path.exists(path)
+
+
     async def terminate(self):
+        await self.prefetcher.stop()
+        await self.budget.stop()
         await self.client.close()
         logger.info("货币汇率查询插件已安全停止")
\ No newline at end of file
@@ -1,5 +1,8 @@
 # 自定义HTML模板
-EXCHANGE_RATE_TMPL = """
+# 模板按区块拆分，单次查询与批量查询共用汇率卡片区块
+
+# 标题区域
+_HEADER_TMPL = """
 <div style="font-family: 'Microsoft YaHei', Arial, sans-serif; padding: 20px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: #333; min-height: 100vh;">
     <div style="background: white; border-radius: 15px; padding: 30px; box-shadow: 0 10px 30px rgba(0,0,0,0.2); margin: 20px auto; max-width: 800px;">
 
@@ -16,7 +19,10 @@ EXCHANGE_RATE_TMPL = """
             </div>
         </div>
 
-        <!-- 汇率对比表格 -->
+"""
+
+# 汇率对比卡片，使用 comparisons 与 past_days 变量
+_COMPARISON_CARDS_TMPL = """        <!-- 汇率对比表格 -->
         {% if comparisons %}
         <div style="margin-top: 20px;">
             {% for comp in comparisons %}
@@ -68,6 +74,126 @@ EXCHANGE_RATE_TMPL = """
             <div style="font-size: 20px;">未找到有效的汇率数据</div>
         </div>
         {% endif %}
+"""
+
+# 页脚
+_FOOTER_TMPL = """
+        <!-- 页脚 -->
+        <div style="text-align: center; margin-top: 30px; padding-top: 20px; border-top: 1px solid #ecf0f1; color: #95a5a6; font-size: 14px;">
+            更新时间: {{ update_time }}
+        </div>
+        {% if stale_note %}
+        <div style="text-align: center; margin-top: 10px; color: #e67e22; font-size: 14px;">
+            {{ stale_note }}
+        </div>
+        {% endif %}
+    </div>
+</div>
+"""
+
+EXCHANGE_RATE_TMPL = _HEADER_TMPL + _COMPARISON_CARDS_TMPL + _FOOTER_TMPL
+
+# 批量查询标题区域
+_BATCH_HEADER_TMPL = """
+<div style="font-family: 'Microsoft YaHei', Arial, sans-serif; padding: 20px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: #333; min-height: 100vh;">
+    <div style="background: white; border-radius: 15px; padding: 30px; box-shadow: 0 10px 30px rgba(0,0,0,0.2); margin: 20px auto; max-width: 800px;">
+
+        <!-- 标题区域 -->
+        <div style="text-align: center; margin-bottom: 30px;">
+            <h1 style="color: #2c3e50; margin: 0; font-size: 32px; font-weight: bold;">
+                💱 汇率批量对比报告
+            </h1>
+            <div style="color: #95a5a6; font-size: 16px; margin-top: 10px;">
+                对比时间: {{ past_days }}天前 vs 当前
+            </div>
+        </div>
+
+"""
+
+# 按基准货币分组的汇率卡片
+_BATCH_GROUPS_TMPL = (
+    """        {% for group in groups %}
+        {% set comparisons = group.comparisons %}
+        <div style="color: #7f8c8d; font-size: 20px; margin-top: 30px; padding-bottom: 10px; border-bottom: 2px solid #ecf0f1;">
+            基准货币: <span style="color: #e74c3c; font-weight: bold;">{{ group.base_currency }}({{ group.base_currency_name }})</span>
+        </div>
+"""
+    + _COMPARISON_CARDS_TMPL
+    + """        {% endfor %}
+"""
+)
+
+EXCHANGE_RATE_BATCH_TMPL = _BATCH_HEADER_TMPL + _BATCH_GROUPS_TMPL + _FOOTER_TMPL
+
+# 汇率走势模板，sparkline 由 points 坐标绘制
+EXCHANGE_RATE_TREND_TMPL = """
+<div style="font-family: 'Microsoft YaHei', Arial, sans-serif; padding: 20px; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: #333; min-height: 100vh;">
+    <div style="background: white; border-radius: 15px; padding: 30px; box-shadow: 0 10px 30px rgba(0,0,0,0.2); margin: 20px auto; max-width: 800px;">
+
+        <!-- 标题区域 -->
+        <div style="text-align: center; margin-bottom: 30px;">
+            <h1 style="color: #2c3e50; margin: 0; font-size: 32px; font-weight: bold;">
+                📈 汇率走势报告
+            </h1>
+            <div style="color: #7f8c8d; font-size: 18px; margin-top: 10px;">
+                基准货币: <span style="color: #e74c3c; font-weight: bold;">{{ base_currency }}({{ base_currency_name }})</span>
+            </div>
+            <div style="color: #95a5a6; font-size: 16px; margin-top: 5px;">
+                统计区间: {{ start_date }} ~ {{ end_date }} (近{{ days }}天)
+            </div>
+        </div>
+
+        <!-- 走势卡片 -->
+        {% if trends %}
+        {% for trend in trends %}
+        <div style="background: #f8f9fa; border-left: 5px solid {% if trend.trend == 'up' %}#27ae60{% elif trend.trend == 'down' %}#e74c3c{% else %}#95a5a6{% endif %};
+                    padding: 20px; margin: 15px 0; border-radius: 10px;">
+
+            <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 10px;">
+                <div>
+                    <span style="font-size: 24px; font-weight: bold; color: #2c3e50;">
+                        {{ trend.currency_code }}
+                    </span>
+                    <span style="color: #7f8c8d; margin-left: 10px;">{{ trend.currency_name }}</span>
+                </div>
+                <div style="font-size: 20px; font-weight: bold;
+                            color: {% if trend.trend == 'up' %}#27ae60{% elif trend.trend == 'down' %}#e74c3c{% else %}#95a5a6{% endif %};">
+                    {{ trend.arrow }} {{ trend.change_percent }}
+                </div>
+            </div>
+
+            <svg viewBox="0 0 {{ chart_width }} {{ chart_height }}" style="width: 100%; height: 120px; background: white; border-radius: 8px;">
+                <polyline fill="none" stroke-width="3" stroke-linejoin="round"
+                          stroke="{% if trend.trend == 'up' %}#27ae60{% elif trend.trend == 'down' %}#e74c3c{% else %}#95a5a6{% endif %}"
+                          points="{{ trend.points }}" />
+            </svg>
+
+            <div style="display: grid; grid-template-columns: 1fr 1fr 1fr 1fr; gap: 10px; margin-top: 15px; text-align: center;">
+                <div>
+                    <div style="color: #7f8c8d; font-size: 14px;">最低</div>
+                    <div style="font-size: 18px; font-weight: bold; color: #2c3e50;">{{ trend.min }}</div>
+                </div>
+                <div>
+                    <div style="color: #7f8c8d; font-size: 14px;">最高</div>
+                    <div style="font-size: 18px; font-weight: bold; color: #2c3e50;">{{ trend.max }}</div>
+                </div>
+                <div>
+                    <div style="color: #7f8c8d; font-size: 14px;">均值</div>
+                    <div style="font-size: 18px; font-weight: bold; color: #2c3e50;">{{ trend.mean }}</div>
+                </div>
+                <div>
+                    <div style="color: #7f8c8d; font-size: 14px;">日波动率</div>
+                    <div style="font-size: 18px; font-weight: bold; color: #2c3e50;">{{ trend.volatility }}</div>
+                </div>
+            </div>
+        </div>
+        {% endfor %}
+        {% else %}
+        <div style="text-align: center; padding: 40px; color: #95a5a6;">
+            <div style="font-size: 48px; margin-bottom: 20px;">❌</div>
+            <div style="font-size: 20px;">未找到有效的汇率数据</div>
+        </div>
+        {% endif %}
 
         <!-- 页脚 -->
         <div style="text-align: center; margin-top: 30px; padding-top: 20px; border-top: 1px solid #ecf0f1; color: #95a5a6; font-size: 14px;">